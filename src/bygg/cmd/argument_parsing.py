@@ -7,7 +7,9 @@ from typing import Any, Literal, TypeAlias
 from bygg.cmd.completions import ByggfileDirectoriesCompleter, EntrypointCompleter
 from bygg.logutils import logger
 
-MaintenanceCommand: TypeAlias = Literal["remove_cache", "remove_environments"]
+MaintenanceCommand: TypeAlias = Literal[
+    "remove_cache", "remove_environments", "show_stats", "serve_cache"
+]
 
 
 @dataclass
@@ -27,7 +29,19 @@ class ByggNamespace:
     jobs: int | None
     always_make: bool
     check: bool
+    no_critical_path: bool
+    merge_actions: bool
+    changed: list[str] | None
+    affected: bool
+    digest_jobs: int | None
+    thread_jobs: int | None
+    async_jobs: int | None
+    artifact_cache: bool
+    remote_cache: str | None
     maintenance_commands: list[MaintenanceCommand]
+    cache_server_address: str | None
+    cache_server_directory: str | None
+    cache_server_connections: int | None
     completions: bool
     dump_schema: bool
     directory: list[str] = field(default_factory=list)
@@ -169,7 +183,7 @@ List available actions:
         nargs="?",
         type=int,
         default=None,
-        help="Specify the number of jobs to run simultaneously. None means to use the number of available cores.",
+        help="Specify the number of jobs to run simultaneously. None means to use the number of available cores. Jobs with the thread and async scheduling types are limited by --thread-jobs and --async-jobs instead; the latter defaults to this number.",
     )
     make_group.add_argument(
         "-B",
@@ -178,6 +192,64 @@ List available actions:
         help="Always build all actions.",
     )
 
+    # Scheduling:
+    scheduling_group = parser.add_argument_group("Scheduling")
+    scheduling_group.add_argument(
+        "--no-critical-path",
+        action="store_true",
+        help="Start ready actions in the order they become ready instead of prioritising the ones with the longest chain of dependent actions, as measured in earlier runs.",
+    )
+    scheduling_group.add_argument(
+        "--merge-actions",
+        action="store_true",
+        help="Build all the given actions that belong to the same environment as one graph in a single run, so that independent actions are built concurrently and shared dependencies are only checked once.",
+    )
+    scheduling_group.add_argument(
+        "--changed",
+        action="extend",
+        nargs="+",
+        metavar="FILE",
+        default=None,
+        help="Only build the actions that use any of the given files, directly or through their dependencies. All other actions are assumed to be up to date and are not checked.",
+    )
+    scheduling_group.add_argument(
+        "--affected",
+        action="store_true",
+        help="List the actions that would be built with --changed instead of building them.",
+    )
+    scheduling_group.add_argument(
+        "--digest-jobs",
+        type=int,
+        metavar="N",
+        default=None,
+        help="Specify the number of threads to use for calculating file digests. 1 calculates them one at a time. None means to use the number of available cores plus four, up to 32.",
+    )
+    scheduling_group.add_argument(
+        "--thread-jobs",
+        type=int,
+        metavar="N",
+        default=None,
+        help="Specify the number of jobs with the thread scheduling type to run simultaneously, in addition to the ones given by --jobs. None means to use four times the number of available cores, up to 64.",
+    )
+    scheduling_group.add_argument(
+        "--async-jobs",
+        type=int,
+        metavar="N",
+        default=None,
+        help="Specify the number of jobs with the async scheduling type to run simultaneously on the event loop, in addition to the ones given by --jobs and --thread-jobs. Async Python functions and shell commands from Byggfile.toml are run this way. None means the same number as for --jobs.",
+    )
+    scheduling_group.add_argument(
+        "--artifact-cache",
+        action="store_true",
+        help="Store the outputs of built actions in .bygg, keyed on their inputs and commands, and restore them from there instead of running the actions when the same inputs are seen again. Outputs that are directories are not stored.",
+    )
+    scheduling_group.add_argument(
+        "--remote-cache",
+        metavar="URL",
+        default=None,
+        help="Share the artifact cache with other machines through an HTTP server at URL, such as one started with 'bygg --cache-server'. Implies --artifact-cache. The build continues without the remote cache if the server can't be reached.",
+    )
+
     # Analyse and verify:
     analyse_group = parser.add_argument_group(
         "Analyse and verify",
@@ -222,6 +294,39 @@ There are also two environment variables available:
         dest="maintenance_commands",
         help="Remove the Python environments.",
     )
+    maintenance_group.add_argument(
+        "--stats",
+        action="append_const",
+        const="show_stats",
+        dest="maintenance_commands",
+        help="Show the slowest actions from the recorded timings of earlier runs and how their timings have changed over time.",
+    )
+    maintenance_group.add_argument(
+        "--cache-server",
+        action="append_const",
+        const="serve_cache",
+        dest="maintenance_commands",
+        help="Serve an artifact cache over HTTP for other machines to use with --remote-cache, until interrupted. Doesn't need a Byggfile. It has no authentication, so only make it reachable from trusted machines.",
+    )
+    maintenance_group.add_argument(
+        "--cache-server-address",
+        metavar="HOST:PORT",
+        default=None,
+        help="Address for --cache-server to listen on. None means 127.0.0.1:8765.",
+    )
+    maintenance_group.add_argument(
+        "--cache-server-directory",
+        metavar="DIR",
+        default=None,
+        help="Directory for --cache-server to store the artifacts in. None means .bygg/cache-server.",
+    )
+    maintenance_group.add_argument(
+        "--cache-server-connections",
+        metavar="N",
+        type=int,
+        default=None,
+        help="Number of requests for --cache-server to handle at the same time. None means 16.",
+    )
 
     # Meta arguments:
     meta_group = parser.add_argument_group("Meta arguments")
@@ -18,6 +18,13 @@ def _get_argument_for_dest(parser: argparse.ArgumentParser, dest: str) -> str |
     return option_strings[-1] if option_strings else ""
 
 
+def _is_repeatable(parser: argparse.ArgumentParser, dest: str) -> bool:
+    """Whether the values for dest are given by repeating the argument, i.e. for
+    arguments with the append and extend actions."""
+    action = _build_dest_to_action(parser).get(dest, None)
+    return isinstance(action, argparse._AppendAction)
+
+
 def unparse_args(
     parser: argparse.ArgumentParser,
     args: argparse.Namespace,
@@ -55,7 +62,9 @@ def unparse_args(
             assert argument
             exec_list.append(argument)
         elif v:
-            if argument:
+            if argument and _is_repeatable(parser, k):
+                exec_list.extend(f"{argument}={item}" for item in v)
+            elif argument:
                 exec_list.append(
                     f"{argument}={','.join(v) if isinstance(v, (list, tuple)) else v}"
                 )
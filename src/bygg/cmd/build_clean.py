@@ -4,6 +4,7 @@ import stat
 import time
 
 from bygg.cmd.datastructures import ByggContext
+from bygg.core.artifact_store import ArtifactStoreStats
 from bygg.core.common_types import RunnerInstruction
 from bygg.core.job import Job
 from bygg.core.runner import get_job_count_limit
@@ -18,21 +19,56 @@ from bygg.output.output import (
 from bygg.output.status_display import failed_checks, output_check_results
 
 
+def format_action_names(action: str | list[str]) -> tuple[str, str]:
+    """Returns the plural suffix and the quoted, comma-separated action names."""
+    actions = [action] if isinstance(action, str) else action
+    return ("s" if len(actions) > 1 else "", ", ".join(f"'{a}'" for a in actions))
+
+
 def build(
     ctx: ByggContext,
-    action: str,
+    action: str | list[str],
     job_count: int | None,
     always_make: bool,
     check: bool,
+    critical_path: bool = True,
+    changed_files: list[str] | None = None,
+    digest_jobs: int | None = None,
+    artifact_cache: bool = False,
+    remote_cache: str | None = None,
+    thread_jobs: int | None = None,
+    async_jobs: int | None = None,
 ) -> tuple[bool, set[str]]:
     """
-    actions: The actions to build.
+    action: The action to build, or a list of actions to build together as one graph.
 
     job_count: The number of jobs to run simultaneously. None means to use the number of
     available cores.
 
     always_make: If True, all actions will be built, even if they are up to date.
 
+    critical_path: If True, start the jobs with the longest chain of dependent jobs
+    first, based on the job durations from earlier runs.
+
+    changed_files: If not None, only build the actions that are affected by these
+    files. The other actions are assumed to be up to date.
+
+    digest_jobs: The number of threads to use for calculating file digests. None means to
+    use the default.
+
+    artifact_cache: If True, restore the outputs of dirty actions from the artifact
+    store when they have been built from the same inputs before, and store the outputs
+    of the actions that are built.
+
+    remote_cache: URL of a remote artifact cache to share the artifact store with.
+    Implies artifact_cache.
+
+    thread_jobs: The number of jobs with the "thread" scheduling type to run
+    simultaneously. None means to use the default.
+
+    async_jobs: The number of jobs with the "async" scheduling type to run
+    simultaneously. None means to use the same number as for job_count.
+
     check: If True, apply various checks:
 
     * Check that the inputs and outputs of all actions will be checked for consistency.
@@ -46,7 +82,8 @@ def build(
         max_workers = get_job_count_limit() if job_count is None else job_count
 
         t1 = time.time()
-        output_info(f"Building action '{action}':")
+        plural_s, action_names = format_action_names(action)
+        output_info(f"Building action{plural_s} {action_names}:")
 
         start_count = 0
         runner_instruction: RunnerInstruction | None = "restart_build"
@@ -61,27 +98,36 @@ def build(
                 action,
                 always_make=always_make,
                 check=check,
+                critical_path=critical_path,
+                changed_files=changed_files,
+                digest_jobs=digest_jobs,
+                artifact_cache=artifact_cache,
+                remote_cache=remote_cache,
             )
 
             # Collect for --watch. Needs to be done here when the graph is built up and
             # before build has started.
-            for job_name in ctx.scheduler.job_graph.get_all_jobs():
+            for job_name in ctx.scheduler.job_order:
                 build_action = ctx.scheduler.build_actions.get(job_name)
                 if build_action:
                     input_files.update(build_action.inputs)
 
-            exit_reasons = ctx.runner.start(max_workers)
+            exit_reasons = ctx.runner.start(max_workers, thread_jobs, async_jobs)
+            if ctx.scheduler.artifact_store:
+                output_artifact_store_stats(ctx.scheduler.artifact_store.stats)
             ctx.scheduler.shutdown()
             runner_instruction = process_exit_reasons(exit_reasons)
 
             if runner_instruction is None:
-                output_ok(f"Action '{action}' completed in {time.time() - t1:.2f} s.")
+                output_ok(
+                    f"Action{plural_s} {action_names} completed in {time.time() - t1:.2f} s."
+                )
             elif runner_instruction == "restart_build":
                 output_info("Restarting build.")
                 pass
             else:
                 output_error(
-                    f"Action '{action}' failed after {time.time() - t1:.2f} s."
+                    f"Action{plural_s} {action_names} failed after {time.time() - t1:.2f} s."
                 )
                 output_job_logs(ctx.runner.failed_jobs)
                 return (False, input_files)
@@ -93,6 +139,9 @@ def build(
     except KeyError as e:
         output_error(f"Error: Action '{e}' not found.")
         return (False, input_files)
+    except ValueError as e:
+        output_error(f"Error: {e}")
+        return (False, input_files)
     finally:
         ctx.scheduler.shutdown()
 
@@ -102,6 +151,18 @@ def build(
     return (True, input_files)
 
 
+def output_artifact_store_stats(stats: ArtifactStoreStats):
+    checked = stats.hits + stats.misses
+    if checked == 0 and stats.stored == 0:
+        return
+    remote = (
+        f" ({stats.remote_hits} from the remote cache)" if stats.remote_hits else ""
+    )
+    output_info(
+        f"Artifact cache: {stats.hits} of {checked} restored{remote}, {stats.stored} stored."
+    )
+
+
 def process_exit_reasons(exit_reasons: list[Job]) -> RunnerInstruction | None:
     if not exit_reasons:
         return None
@@ -118,11 +179,13 @@ def process_exit_reasons(exit_reasons: list[Job]) -> RunnerInstruction | None:
     return "exit_job_failed"
 
 
-def clean(ctx: ByggContext, action: str):
+def clean(ctx: ByggContext, action: str | list[str]):
     try:
-        output_info(f"Cleaning action '{action}':")
+        plural_s, action_names = format_action_names(action)
+        output_info(f"Cleaning action{plural_s} {action_names}:")
         ctx.scheduler.prepare_run(action)
-        for job_name in ctx.scheduler.job_graph.get_all_jobs():
+        # Clean the actions that depend on others first
+        for job_name in reversed(ctx.scheduler.job_order):
             job = ctx.scheduler.build_actions.get(job_name, None)
             if job is None:
                 continue
@@ -144,6 +207,29 @@ def clean(ctx: ByggContext, action: str):
     except KeyError as e:
         output_error(f"Error: Action '{e}' not found.")
         return False
+    except ValueError as e:
+        output_error(f"Error: {e}")
+        return False
+    finally:
+        ctx.scheduler.shutdown()
+
+    return True
+
+
+def list_affected(ctx: ByggContext, action: str | list[str], changed_files: list[str]):
+    """Print the actions that would be built with the changed files, in build order."""
+    try:
+        ctx.scheduler.prepare_run(action)
+        affected_jobs = ctx.scheduler.find_affected_jobs(changed_files)
+        for job_name in ctx.scheduler.job_order:
+            if job_name in affected_jobs:
+                output_plain(job_name)
+    except KeyError as e:
+        output_error(f"Error: Action '{e}' not found.")
+        return False
+    except ValueError as e:
+        output_error(f"Error: {e}")
+        return False
     finally:
         ctx.scheduler.shutdown()
 
@@ -0,0 +1,159 @@
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+from pathlib import Path
+import shutil
+import sys
+import threading
+
+from bygg.core.digest import DIGEST_TYPE
+from bygg.core.remote_cache import (
+    DEFAULT_REMOTE_CACHE_CONNECTIONS,
+    KEY_PATTERN,
+    TRANSFER_CHUNK_SIZE,
+)
+from bygg.core.scaffolding import STATUS_DIR
+from bygg.logutils import logger
+from bygg.output.output import output_info
+
+DEFAULT_CACHE_SERVER_DIR = STATUS_DIR / "cache-server"
+DEFAULT_CACHE_SERVER_HOST = "127.0.0.1"
+DEFAULT_CACHE_SERVER_PORT = 8765
+
+# Requests that are handled at the same time; further requests wait for their turn
+DEFAULT_CACHE_SERVER_CONNECTIONS = 4 * DEFAULT_REMOTE_CACHE_CONNECTIONS
+
+
+class CacheServer(ThreadingHTTPServer):
+    """
+    Reference server for the remote artifact cache protocol, see RemoteArtifactCache.
+    Blobs are stored in cas/ and manifests in ac/ under the root directory. It has no
+    authentication and is meant for trying out the remote cache on localhost.
+    """
+
+    daemon_threads = True
+    root: Path
+    request_slots: threading.BoundedSemaphore
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        root: Path,
+        max_connections: int = DEFAULT_CACHE_SERVER_CONNECTIONS,
+    ):
+        self.root = root
+        self.request_slots = threading.BoundedSemaphore(max(max_connections, 1))
+        for kind in ("cas", "ac"):
+            (root / kind).mkdir(parents=True, exist_ok=True)
+        super().__init__(address, CacheRequestHandler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        if isinstance(host, bytes):
+            host = host.decode()
+        return f"http://{host}:{port}"
+
+
+class CacheRequestHandler(BaseHTTPRequestHandler):
+    server: CacheServer
+
+    def handle(self):
+        with self.server.request_slots:
+            super().handle()
+
+    def log_message(self, format, *args):
+        logger.info("Cache server: " + format, *args)
+
+    def resolve(self) -> tuple[str, str] | None:
+        """The kind and name of the requested resource, None if it's not valid."""
+        match self.path.split("/"):
+            case ["", ("cas" | "ac") as kind, name] if KEY_PATTERN.fullmatch(name):
+                return (kind, name)
+        return None
+
+    def do_HEAD(self):
+        self.send_stored_file(with_body=False)
+
+    def do_GET(self):
+        self.send_stored_file(with_body=True)
+
+    def send_stored_file(self, with_body: bool):
+        resource = self.resolve()
+        if resource is None:
+            self.send_error(400)
+            return
+        kind, name = resource
+        try:
+            f = open(self.server.root / kind / name, "rb")
+        except FileNotFoundError:
+            self.send_error(404)
+            return
+        with f:
+            self.send_response(200)
+            self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+            self.end_headers()
+            if with_body:
+                shutil.copyfileobj(f, self.wfile, TRANSFER_CHUNK_SIZE)
+
+    def do_PUT(self):
+        resource = self.resolve()
+        length = int(self.headers.get("Content-Length", -1))
+        if resource is None or length < 0:
+            self.send_error(400)
+            return
+        kind, name = resource
+        target = self.server.root / kind / name
+        tmp_file = target.with_name(f"{name}.{threading.get_ident()}.tmp")
+
+        hasher = hashlib.new(DIGEST_TYPE)
+        remaining = length
+        with open(tmp_file, "wb") as f:
+            while remaining > 0:
+                chunk = self.rfile.read(min(TRANSFER_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                f.write(chunk)
+                remaining -= len(chunk)
+
+        if remaining > 0 or (kind == "cas" and hasher.hexdigest() != name):
+            # Incomplete upload, or the content doesn't match its name
+            tmp_file.unlink(missing_ok=True)
+            self.send_error(400)
+            return
+        os.replace(tmp_file, target)
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def parse_address(address: str | None) -> tuple[str, int]:
+    """Parse HOST:PORT, HOST or :PORT, with the defaults for the missing parts."""
+    address = address or ""
+    host, _, port = address.rpartition(":") if ":" in address else (address, "", "")
+    return (host or DEFAULT_CACHE_SERVER_HOST, int(port or DEFAULT_CACHE_SERVER_PORT))
+
+
+def serve_cache(
+    address: str | None = None,
+    directory: Path | None = None,
+    max_connections: int | None = None,
+):
+    """
+    Run a CacheServer until interrupted. Used by the --cache-server maintenance command.
+    None means the default for each argument.
+    """
+    directory = directory or DEFAULT_CACHE_SERVER_DIR
+    with CacheServer(
+        parse_address(address),
+        directory,
+        max_connections or DEFAULT_CACHE_SERVER_CONNECTIONS,
+    ) as server:
+        output_info(f"Serving the artifact cache in {directory} on {server.url}")
+        # For when the output goes to a log file or a pipe
+        sys.stdout.flush()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -32,9 +32,18 @@ class Settings:
             self.default_action = other.default_action
         if other.verbose is not None:
             self.verbose = other.verbose
+        if other.preload_modules is not None:
+            self.preload_modules = other.preload_modules
+        if other.output_tail_size is not None:
+            self.output_tail_size = other.output_tail_size
 
     default_action: Optional[str] = None
     verbose: Optional[bool] = None
+    # Modules to import before the worker processes are started
+    preload_modules: Optional[list[str]] = None
+    # Bytes from the end of the output of the shell actions that are kept in their
+    # status; the full output is in their log files
+    output_tail_size: Optional[int] = None
 
 
 @dataclasses.dataclass
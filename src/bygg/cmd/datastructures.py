@@ -36,6 +36,8 @@ class SubProcessIpcData:
     return_code: int = 0
     found_input_files: set[str] = field(default_factory=set)
     failed_jobs: dict[str, CommandStatus] = field(default_factory=dict)
+    # Python files that were evaluated to collect the data
+    evaluated_files: set[str] = field(default_factory=set)
 
 
 @dataclass
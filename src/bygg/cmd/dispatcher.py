@@ -34,10 +34,11 @@ from bygg.cmd.environments import (
     setup_environment,
     should_restart_with,
 )
+from bygg.cmd.evaluation_cache import EvaluationCache, calculate_evaluation_key
 from bygg.cmd.list_actions import list_collect_for_environment, print_actions
 from bygg.cmd.maintenance import perform_maintenance
 from bygg.cmd.tree import print_tree, tree_collect_for_environment
-from bygg.core.runner import ProcessRunner
+from bygg.core.runner import ProcessRunner, WorkerPool
 from bygg.core.scheduler import Scheduler
 from bygg.logutils import logger
 from bygg.output.output import TerminalStyle as TS
@@ -54,9 +55,11 @@ def init_bygg_context(
     parser: argparse.ArgumentParser,
     args_namespace: argparse.Namespace,
     args: ByggNamespace,
+    worker_pool: WorkerPool | None = None,
 ) -> ByggContext:
     scheduler = Scheduler()
-    runner = ProcessRunner(scheduler)
+    scheduler.preload_modules.update(configuration.settings.preload_modules or [])
+    runner = ProcessRunner(scheduler, worker_pool)
 
     # Set up status listeners
     runner.job_status_listener = get_on_job_status(args, configuration)
@@ -92,24 +95,26 @@ def bygg():
     do_completion(parser)
     args = parser.parse_args()
     if not args.is_restarted_with_env:
-        # Build and potentially watch:
+        # Build and potentially watch. The workers are kept between the rebuilds.
         rc = 0
-        while True:
-            with change_dir(None):  # change back to the starting dir
-                environment_data_list = parent_dispatcher(parser, args)
+        with WorkerPool() as worker_pool:
+            while True:
+                with change_dir(None):  # change back to the starting dir
+                    environment_data_list = parent_dispatcher(parser, args, worker_pool)
 
-                rc = output_status_codes(environment_data_list)
-                files_to_watch = extract_input_files(environment_data_list)
-                if not args.watch or len(files_to_watch) == 0:
-                    break
+                    rc = output_status_codes(environment_data_list)
+                    files_to_watch = extract_input_files(environment_data_list)
+                    if not args.watch or len(files_to_watch) == 0:
+                        break
 
-                from bygg.cmd.watch import do_watch
+                    from bygg.cmd.watch import do_watch
 
-                output_info("Watching for changes")
-                do_watch(files_to_watch)
+                    output_info("Watching for changes")
+                    do_watch(files_to_watch)
         return rc
     else:
-        subprocess_dispatcher(parser, args)
+        with WorkerPool() as worker_pool:
+            subprocess_dispatcher(parser, args, worker_pool)
 
 
 def output_status_codes(
@@ -147,10 +152,14 @@ def extract_input_files(
 def parent_dispatcher(
     parser: argparse.ArgumentParser,
     args_namespace: argparse.Namespace,
+    worker_pool: WorkerPool | None = None,
 ) -> list[dict[str, SubProcessIpcData]]:
     """
     Takes both argparse.ArgumentParser and argparse.Namespace arguments since it can be
     called also from completers. However, it is not used by subprocesses.
+
+    worker_pool: Keeps the worker processes between calls, e.g. in watch mode. If None,
+    the workers only live for one run.
     """
 
     args = ByggNamespace(**vars(args_namespace))
@@ -167,6 +176,19 @@ def parent_dispatcher(
         print_version()
         sys.exit(0)
 
+    if args.affected and args.changed is None:
+        output_error(
+            "The --affected command requires files to be given with --changed."
+        )
+        sys.exit(1)
+
+    if args.changed:
+        # The files are given relative to the starting directory. Also update the
+        # namespace that is passed on to the environment subprocesses.
+        args.changed = args_namespace.changed = [
+            os.path.abspath(f) for f in args.changed
+        ]
+
     # Change directory if needed
     directory = args.directory[0] if args.directory else None
 
@@ -180,8 +202,8 @@ def parent_dispatcher(
         output_error("Cannot use -w/--watch with maintenance commands")
         sys.exit(1)
 
-    # No byggfiles
-    if not has_byggfile():
+    # No byggfiles. The cache server doesn't need any.
+    if not has_byggfile() and set(args.maintenance_commands or []) != {"serve_cache"}:
         output_error("No build files found.")
         sys.exit(1)
 
@@ -190,11 +212,11 @@ def parent_dispatcher(
 
     # Perform maintenance commands
     if args.maintenance_commands:
-        perform_maintenance(configuration, args.maintenance_commands)
+        perform_maintenance(configuration, args.maintenance_commands, args)
         sys.exit(0)
 
     # Create runner and scheduler and such
-    ctx = init_bygg_context(configuration, parser, args_namespace, args)
+    ctx = init_bygg_context(configuration, parser, args_namespace, args, worker_pool)
 
     actions_to_build = [*args.actions]
     if not args.actions and ctx.configuration.settings.default_action is not None:
@@ -208,7 +230,7 @@ def parent_dispatcher(
 
     # We have nothing to build, but other things to do
     if only_collect:
-        environment_data = do_in_all_environments(ctx, run_or_collect_in_environment)
+        environment_data = collect_in_all_environments(ctx)
 
         if is_completing():
             return [environment_data]
@@ -248,31 +270,49 @@ def parent_dispatcher(
 
     # Here we have something to build
 
+    # Build all actions in one go for each environment
+    if args.merge_actions:
+        environment_data = do_in_all_environments(
+            ctx,
+            lambda ctx, environment_name: run_or_collect_in_environment(
+                ctx, environment_name, actions=actions_to_build
+            ),
+            start_with_env=get_environment_for_action(ctx, actions_to_build[0]),
+        )
+        exit_if_actions_not_found(actions_to_build, environment_data)
+        return [environment_data]
+
     environment_data_list = []
 
     for action in actions_to_build:
         environment_data = do_in_all_environments(
             ctx,
             lambda ctx, environment_name: run_or_collect_in_environment(
-                ctx, environment_name, action=action
+                ctx, environment_name, actions=[action]
             ),
             start_with_env=get_environment_for_action(ctx, action),
         )
-        all_found_actions = set().union(
-            *(env.found_actions for env in environment_data.values())
-        )
-
-        if action not in all_found_actions:
-            output_error(
-                f"Error: The following action could not be found: {TS.BOLD}'{action}'{TS.NOBOLD}."
-            )
-            sys.exit(1)
-
+        exit_if_actions_not_found([action], environment_data)
         environment_data_list.append(environment_data)
 
     return environment_data_list
 
 
+def exit_if_actions_not_found(
+    actions: list[str], environment_data: dict[str, SubProcessIpcData]
+):
+    all_found_actions = set().union(
+        *(env.found_actions for env in environment_data.values())
+    )
+    not_found_actions = [f"'{a}'" for a in actions if a not in all_found_actions]
+    if not_found_actions:
+        plural = len(not_found_actions) > 1
+        output_error(
+            f"Error: The following action{'s' if plural else ''} could not be found: {TS.BOLD}{', '.join(not_found_actions)}{TS.NOBOLD}."
+        )
+        sys.exit(1)
+
+
 DoerType: TypeAlias = Callable[[ByggContext, str], tuple[SubProcessIpcData, bool]]
 """Takes a ByggContext and an action name as arguments and returns a tuple of the
 subprocess IPC data and whether the action was handled."""
@@ -301,15 +341,47 @@ def do_in_all_environments(
     return environment_data
 
 
+def collect_in_all_environments(ctx: ByggContext) -> dict[str, SubProcessIpcData]:
+    """
+    Collects the data for all environments. Environments whose Byggfiles haven't
+    changed since they were last evaluated are served from the evaluation cache.
+    """
+    evaluation_cache = EvaluationCache()
+    evaluation_cache.load()
+    # The tree is not collected in-process when completing, see below
+    need_tree = not is_completing()
+
+    def collect(
+        ctx: ByggContext, environment_name: str
+    ) -> tuple[SubProcessIpcData, bool]:
+        key = calculate_evaluation_key(ctx.configuration, environment_name)
+        if key and (
+            cached_data := evaluation_cache.get(environment_name, key, need_tree)
+        ):
+            return (cached_data, False)
+        subprocess_data, early_out = run_or_collect_in_environment(
+            ctx, environment_name
+        )
+        if key:
+            evaluation_cache.set(environment_name, key, subprocess_data, need_tree)
+        return (subprocess_data, early_out)
+
+    environment_data = do_in_all_environments(ctx, collect)
+    evaluation_cache.save()
+    return environment_data
+
+
 def run_or_collect_in_environment(
     ctx: ByggContext,
     environment_name: str,
     *,
-    action: Optional[str] = None,
+    actions: Optional[list[str]] = None,
 ) -> tuple[SubProcessIpcData, bool]:
     """
-    Runs the given action in the given environment or just collects data about the
-    environment. These two flows are roughly the same.
+    Runs the given actions in the given environment or just collects data about the
+    environment. These two flows are roughly the same. The actions that are found in the
+    environment are built together. Returns the environment data and whether all the
+    actions were found.
     """
     subprocess_data = SubProcessIpcData()
 
@@ -328,13 +400,15 @@ def run_or_collect_in_environment(
                 ctx,
                 environment_name=environment_name,
                 subprocess_bygg_path=subprocess_bygg_path,
-                action=action,
+                actions=actions,
+            )
+            all_found = bool(actions) and all(
+                a in result.found_actions for a in actions or []
             )
-            action_found = action is not None and action in result.found_actions
-            return (result, action_found)
+            return (result, all_found)
 
     logger.info("Running-collecting: in ambient environment")
-    load_environment(ctx, environment_name)
+    subprocess_data.evaluated_files = load_environment(ctx, environment_name)
     logger.debug(
         "Entrypoints found for %s: %s",
         environment_name,
@@ -355,21 +429,31 @@ def run_or_collect_in_environment(
     )
 
     # Our work here is done, or, we had nothing to do
-    if action is None or action not in subprocess_data.found_actions:
+    found_actions = [a for a in actions or [] if a in subprocess_data.found_actions]
+    if not found_actions:
         return (subprocess_data, False)
 
     # Build or clean handled below. These are the only commands handled here.
-    from bygg.cmd.build_clean import build, clean
+    from bygg.cmd.build_clean import build, clean, list_affected
 
     if ctx.bygg_namespace.clean:
-        status = clean(ctx, action)
+        status = clean(ctx, found_actions)
+    elif ctx.bygg_namespace.affected and ctx.bygg_namespace.changed is not None:
+        status = list_affected(ctx, found_actions, ctx.bygg_namespace.changed)
     else:
         status, input_files = build(
             ctx,
-            action,
+            found_actions,
             ctx.bygg_namespace.jobs,
             ctx.bygg_namespace.always_make,
             ctx.bygg_namespace.check,
+            not ctx.bygg_namespace.no_critical_path,
+            ctx.bygg_namespace.changed,
+            ctx.bygg_namespace.digest_jobs,
+            ctx.bygg_namespace.artifact_cache,
+            ctx.bygg_namespace.remote_cache,
+            ctx.bygg_namespace.thread_jobs,
+            ctx.bygg_namespace.async_jobs,
         )
         subprocess_data.found_input_files.update(input_files)
     if not status:
@@ -380,7 +464,7 @@ def run_or_collect_in_environment(
         }
 
     # All critical errors will already have done sys.exit
-    return (subprocess_data, True)
+    return (subprocess_data, len(found_actions) == len(actions or []))
 
 
 @contextlib.contextmanager
@@ -401,15 +485,15 @@ def spawn_subprocess(
     *,
     environment_name: str,
     subprocess_bygg_path: str,
-    action: str | None = None,
+    actions: list[str] | None = None,
 ) -> SubProcessIpcData:
     # Create IPC file
 
     with auto_tmpfile() as ipc_filename:
         exec_list = []
         exec_list += [subprocess_bygg_path]
-        if action:
-            exec_list += [action]
+        if actions:
+            exec_list += actions
         exec_list += unparse_args(
             ctx.parser,
             ctx.args_namespace,
@@ -434,7 +518,7 @@ def spawn_subprocess(
                     pass
                 case subprocess.CalledProcessError():
                     output_error(
-                        f"Action {TS.BOLD}{action}{TS.NOBOLD}: status {e.returncode}"
+                        f"Action {TS.BOLD}{', '.join(actions or [])}{TS.NOBOLD}: status {e.returncode}"
                     )
                     sys.exit(e.returncode)
                 case FileNotFoundError():
@@ -466,11 +550,13 @@ def spawn_subprocess(
     sys.exit(1)
 
 
-def subprocess_dispatcher(parser, args_namespace):
+def subprocess_dispatcher(
+    parser, args_namespace, worker_pool: WorkerPool | None = None
+):
     # We're in subprocess
 
-    # Always called with at most one action at a time; it is up to the caller to loop
-    # over the action list.
+    # Called with one action at a time, or with all the actions to build for the
+    # environment if they are to be merged into one graph.
 
     args = ByggNamespace(**vars(args_namespace))
     assert args.is_restarted_with_env
@@ -485,10 +571,10 @@ def subprocess_dispatcher(parser, args_namespace):
     configuration = read_config_files()
 
     # Create runner and scheduler and such
-    ctx = init_bygg_context(configuration, parser, args_namespace, args)
+    ctx = init_bygg_context(configuration, parser, args_namespace, args, worker_pool)
 
     ctx.ipc_data = SubProcessIpcData()
-    load_environment(ctx, environment_name)
+    ctx.ipc_data.evaluated_files = load_environment(ctx, environment_name)
 
     logger.debug(
         "Entrypoints found for %s: %s",
@@ -498,7 +584,7 @@ def subprocess_dispatcher(parser, args_namespace):
     ctx.ipc_data.found_actions = {
         e.name for e in get_entrypoints(ctx, environment_name)
     }
-    action = args.actions[0] if args.actions else None
+    actions = [a for a in args.actions if a in ctx.scheduler.build_actions]
 
     ctx.ipc_data.list = list_collect_for_environment(ctx, environment_name)
     ctx.ipc_data.tree = tree_collect_for_environment(ctx, environment_name)
@@ -507,17 +593,30 @@ def subprocess_dispatcher(parser, args_namespace):
         write_ipc_data(ctx, args)
         sys.exit(DISPATCHER_IS_COMPLETING_EXIT_CODE)
 
-    if action and action not in ctx.scheduler.build_actions or not action:
+    if not actions:
         write_ipc_data(ctx, args)
         sys.exit(DISPATCHER_ACTION_NOT_FOUND_EXIT_CODE)
 
-    from bygg.cmd.build_clean import build, clean
+    from bygg.cmd.build_clean import build, clean, list_affected
 
     if args.clean:
-        status = clean(ctx, action)
+        status = clean(ctx, actions)
+    elif args.affected and args.changed is not None:
+        status = list_affected(ctx, actions, args.changed)
     else:
         status, input_files = build(
-            ctx, action, args.jobs, args.always_make, args.check
+            ctx,
+            actions,
+            args.jobs,
+            args.always_make,
+            args.check,
+            not args.no_critical_path,
+            args.changed,
+            args.digest_jobs,
+            args.artifact_cache,
+            args.remote_cache,
+            args.thread_jobs,
+            args.async_jobs,
         )
         ctx.ipc_data.found_input_files.update(input_files)
 
@@ -18,7 +18,7 @@ from bygg.core.action import Action
 from bygg.core.digest import calculate_string_digest
 from bygg.logutils import logger
 from bygg.output.output import output_error, output_info, output_plain
-from bygg.util import create_shell_command
+from bygg.util import DEFAULT_OUTPUT_TAIL_SIZE, create_shell_command
 
 
 def calculate_environment_hash(environment: Environment) -> str:
@@ -102,7 +102,11 @@ def remove_environments(configuration: Byggfile) -> list[str]:
     return removed_environments
 
 
-def load_environment(ctx: ByggContext, environment_name: str):
+def load_environment(ctx: ByggContext, environment_name: str) -> set[str]:
+    """
+    Registers the actions for the environment. Returns the Python files that were
+    evaluated, including the local modules that they imported.
+    """
     environment = ctx.configuration.environments.get(environment_name, None)
 
     # Now set up the actions for the current environment:
@@ -114,12 +118,33 @@ def load_environment(ctx: ByggContext, environment_name: str):
     if environment_name == DEFAULT_ENVIRONMENT_NAME and PYTHON_INPUTFILE in {
         bf.byggfile for bf in ctx.configuration.environments.values()
     }:
-        return None
+        return set()
 
     python_build_file = environment.byggfile if environment else PYTHON_INPUTFILE
-    if python_build_file:
-        load_python_build_file(python_build_file, environment_name)
-    return None
+    if not python_build_file:
+        return set()
+
+    modules_before = set(sys.modules)
+    load_python_build_file(python_build_file, environment_name)
+    return {
+        python_build_file,
+        *find_local_module_files(set(sys.modules) - modules_before),
+    }
+
+
+def find_local_module_files(module_names: set[str]) -> set[str]:
+    """Files of the given modules that live in the current directory tree, excluding
+    installed packages such as the ones in a local venv."""
+    cwd = Path.cwd().resolve()
+    files: set[str] = set()
+    for name in module_names:
+        module_file = getattr(sys.modules.get(name), "__file__", None)
+        if not module_file:
+            continue
+        path = Path(module_file).resolve()
+        if path.is_relative_to(cwd) and "site-packages" not in path.parts:
+            files.add(str(path.relative_to(cwd)))
+    return files
 
 
 def register_actions_from_configuration(
@@ -128,6 +153,9 @@ def register_actions_from_configuration(
     logger.info(
         "Registering actions from configuration for '%s'", is_restarted_with_env
     )
+    output_tail_size = configuration.settings.output_tail_size
+    if output_tail_size is None:
+        output_tail_size = DEFAULT_OUTPUT_TAIL_SIZE
     for action_name, action in configuration.actions.items():
         if TYPE_CHECKING:
             assert not isinstance(action, str)
@@ -144,7 +172,11 @@ def register_actions_from_configuration(
         logger.info("Registering action '%s'", action_name)
         logger.debug("Action: %s", action)
         shell_command = (
-            create_shell_command(action.shell, action.message) if action.shell else None
+            create_shell_command(
+                action.shell, action.message, output_tail_size=output_tail_size
+            )
+            if action.shell
+            else None
         )
         Action(
             action_name,
@@ -155,6 +187,8 @@ def register_actions_from_configuration(
             outputs=action.outputs,
             dependencies=action.dependencies,
             command=shell_command,
+            # The command just waits for the shell, so no need for a worker
+            scheduling_type="async",
             environment=action.environment,
         )
 
@@ -0,0 +1,128 @@
+from dataclasses import dataclass
+import importlib.metadata
+import os
+from pathlib import Path
+import pickle
+import sys
+
+from bygg.cmd.configuration import Byggfile, get_config_files
+from bygg.cmd.datastructures import SubProcessIpcData
+from bygg.cmd.environments import calculate_environment_hash
+from bygg.core.digest import calculate_digest, calculate_file_digest
+from bygg.core.scaffolding import STATUS_DIR, make_sure_status_dir_exists
+from bygg.logutils import logger
+from bygg.output.output import isatty
+
+DEFAULT_EVALUATION_CACHE_FILE = STATUS_DIR / "evaluation_cache.db"
+
+
+@dataclass
+class EvaluationCacheEntry:
+    """The collected data for one environment and what it was collected from."""
+
+    # Digest of the static configuration, see calculate_evaluation_key
+    key: str
+    # Digests of the Python files that were evaluated, None for missing files
+    file_digests: dict[str, str | None]
+    ipc_data: SubProcessIpcData
+    # Whether the tree was formatted for a terminal; None if it was not collected
+    tree_isatty: bool | None
+
+
+class EvaluationCache:
+    """
+    Keeps the results of evaluating the Byggfiles for each environment, so that --list,
+    --tree and shell completion can be served without evaluating any Python code.
+    """
+
+    entries: dict[str, EvaluationCacheEntry]
+    cache_file: Path
+    is_dirty: bool
+
+    def __init__(self, cache_file: Path = DEFAULT_EVALUATION_CACHE_FILE):
+        self.entries = {}
+        self.cache_file = cache_file
+        self.is_dirty = False
+
+    @classmethod
+    def reset(cls):
+        DEFAULT_EVALUATION_CACHE_FILE.unlink(missing_ok=True)
+
+    def load(self):
+        try:
+            with open(self.cache_file, "rb") as f:
+                self.entries = pickle.load(f)
+        except (EOFError, FileNotFoundError, pickle.UnpicklingError, AttributeError):
+            self.entries = {}
+
+    def save(self):
+        if not self.is_dirty:
+            return
+        try:
+            make_sure_status_dir_exists()
+            with open(self.cache_file, "wb") as f:
+                pickle.dump(self.entries, f)
+            self.is_dirty = False
+        except OSError as e:
+            logger.warning("Could not write evaluation cache: %s", e)
+
+    def get(
+        self, environment_name: str, key: str, need_tree: bool
+    ) -> SubProcessIpcData | None:
+        entry = self.entries.get(environment_name)
+        if entry is None or entry.key != key:
+            return None
+        if need_tree and entry.tree_isatty != isatty:
+            return None
+        for file, digest in entry.file_digests.items():
+            if calculate_file_digest(file) != digest:
+                logger.info("Evaluation cache: %s has changed", file)
+                return None
+        logger.info("Evaluation cache: hit for environment %s", environment_name)
+        return entry.ipc_data
+
+    def set(
+        self,
+        environment_name: str,
+        key: str,
+        ipc_data: SubProcessIpcData,
+        has_tree: bool,
+    ):
+        self.entries[environment_name] = EvaluationCacheEntry(
+            key,
+            {f: calculate_file_digest(f) for f in sorted(ipc_data.evaluated_files)},
+            ipc_data,
+            isatty if has_tree else None,
+        )
+        self.is_dirty = True
+
+
+def calculate_evaluation_key(
+    configuration: Byggfile, environment_name: str
+) -> str | None:
+    """
+    Digest of everything that the evaluation of an environment depends on, apart from
+    the Python files themselves. Returns None if it can't be calculated, in which case
+    the environment should not be cached.
+    """
+    try:
+        version = importlib.metadata.version("bygg")
+    except importlib.metadata.PackageNotFoundError:
+        # E.g. when run from a source checkout, where changes to bygg itself would then
+        # go unnoticed
+        return None
+    items = [
+        version,
+        sys.executable,
+        environment_name,
+        f"BYGG_DEV={os.environ.get('BYGG_DEV', '')}",
+    ]
+    items += [f"{f}:{calculate_file_digest(f)}" for f in get_config_files()]
+
+    environment = configuration.environments.get(environment_name)
+    if environment:
+        try:
+            items.append(calculate_environment_hash(environment))
+        except OSError:
+            return None
+    return calculate_digest(items)
@@ -1,23 +1,54 @@
-from bygg.cmd.argument_parsing import MaintenanceCommand
+from pathlib import Path
+
+from bygg.cmd.argument_parsing import ByggNamespace, MaintenanceCommand
 from bygg.cmd.configuration import Byggfile
 from bygg.cmd.environments import remove_environments
+from bygg.cmd.evaluation_cache import EvaluationCache
+from bygg.cmd.stats import print_artifact_store_stats, print_stats
+from bygg.core.artifact_store import ArtifactStore
 from bygg.core.cache import Cache
+from bygg.core.digest import FileDigestCache
+from bygg.core.timings import Timings
 from bygg.logutils import logger
 from bygg.output.output import output_info
 
 
-def perform_maintenance(configuration: Byggfile, commands: list[MaintenanceCommand]):
+def perform_maintenance(
+    configuration: Byggfile,
+    commands: list[MaintenanceCommand],
+    args: ByggNamespace | None = None,
+):
     logger.debug("Maintenance commands: %s", commands)
-    # Sorting for testability and tidyness
-    unique_cmds = sorted(set(commands))
+    # Sorting for testability and tidyness. The cache server runs until interrupted, so
+    # it goes last.
+    unique_cmds = sorted(set(commands) - {"serve_cache"})
+    if "serve_cache" in commands:
+        unique_cmds.insert(0, "serve_cache")
 
     while unique_cmds and (cmd := unique_cmds.pop()):
         match cmd:
             case "remove_cache":
                 output_info("Removing cache")
                 Cache.reset()
+                EvaluationCache.reset()
+                Timings.reset()
+                FileDigestCache.reset()
+                ArtifactStore.reset()
             case "remove_environments":
                 output_info("Removing environments")
                 remove_environments(configuration)
+            case "show_stats":
+                print_stats(Timings())
+                print_artifact_store_stats(ArtifactStore())
+            case "serve_cache":
+                from bygg.cmd.cache_server import serve_cache
+
+                serve_cache(
+                    args.cache_server_address if args else None,
+                    Path(args.cache_server_directory)
+                    if args and args.cache_server_directory
+                    else None,
+                    args.cache_server_connections if args else None,
+                )
             case _:
                 raise ValueError(f"Unknown maintenance command '{cmd}'")
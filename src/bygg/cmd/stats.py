@@ -0,0 +1,112 @@
+import statistics
+
+from bygg.core.artifact_store import ArtifactStore
+from bygg.core.timings import JobTiming, Timings
+from bygg.output.output import TerminalStyle as TS
+from bygg.output.output import output_info, output_plain
+
+# Number of actions to show in the report
+STATS_ACTION_COUNT = 20
+
+SPARKLINE_CHARACTERS = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(values: list[float]) -> str:
+    """Render the values as a string of block characters scaled between min and max."""
+    low, high = min(values), max(values)
+    span = high - low
+    if span == 0:
+        return SPARKLINE_CHARACTERS[0] * len(values)
+    last_index = len(SPARKLINE_CHARACTERS) - 1
+    return "".join(
+        SPARKLINE_CHARACTERS[round((v - low) / span * last_index)] for v in values
+    )
+
+
+def format_bytes(size: int | None) -> str:
+    if size is None:
+        return "-"
+    value = float(size)
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if value < 1024:
+            return f"{value:.0f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TiB"
+
+
+def format_seconds(seconds: float | None) -> str:
+    return "-" if seconds is None else f"{seconds:.2f}"
+
+
+def format_trend(history: list[JobTiming]) -> str:
+    """Sparkline of the wall times together with the change from the first run."""
+    wall_times = [t.wall_time for t in history]
+    trend = sparkline(wall_times)
+    if len(wall_times) > 1 and wall_times[0] > 0:
+        change = (wall_times[-1] - wall_times[0]) / wall_times[0] * 100
+        trend += f" {change:+.0f}%"
+    return trend
+
+
+def print_stats(timings: Timings, count: int = STATS_ACTION_COUNT):
+    """Print the slowest actions by median wall time, and how their timings changed."""
+    timings.load()
+    histories = {
+        name: history for name, history in timings.data.history.items() if history
+    }
+    if not histories:
+        output_info("No timing statistics recorded yet.")
+        return
+
+    slowest = sorted(
+        histories.items(),
+        key=lambda item: statistics.median(t.wall_time for t in item[1]),
+        reverse=True,
+    )[:count]
+
+    header = ("Action", "Runs", "Wall (s)", "CPU (s)", "Peak RSS", "Trend")
+    rows: list[tuple[str, ...]] = []
+    for name, history in slowest:
+        cpu_times = [t.cpu_time for t in history if t.cpu_time is not None]
+        peak_rss_values = [t.peak_rss for t in history if t.peak_rss is not None]
+        rows.append(
+            (
+                name,
+                str(len(history)),
+                format_seconds(statistics.median(t.wall_time for t in history)),
+                format_seconds(statistics.median(cpu_times) if cpu_times else None),
+                format_bytes(max(peak_rss_values) if peak_rss_values else None),
+                format_trend(history),
+            )
+        )
+
+    widths = [max(len(row[i]) for row in [header, *rows]) for i in range(len(header))]
+
+    def format_row(row: tuple[str, ...]) -> str:
+        name, *numbers, trend = row
+        return "  ".join(
+            [
+                f"{name:<{widths[0]}}",
+                *(f"{n:>{w}}" for n, w in zip(numbers, widths[1:-1])),
+                trend,
+            ]
+        )
+
+    output_plain(
+        f"{TS.BOLD}Slowest actions (median of the last runs, oldest run first in the trend):{TS.RESET}\n"
+    )
+    output_plain(f"{TS.BOLD}{format_row(header)}{TS.RESET}")
+    for row in rows:
+        output_plain(format_row(row))
+
+
+def print_artifact_store_stats(store: ArtifactStore):
+    """Print the hit rate and size of the artifact store, if it has been used."""
+    totals = store.read_totals()
+    checked = totals.hits + totals.misses
+    if checked == 0 and totals.stored == 0:
+        return
+    hit_rate = f"{100 * totals.hits / checked:.0f} %" if checked else "-"
+    output_plain(
+        f"\n{TS.BOLD}Artifact cache:{TS.RESET} {totals.hits} of {checked} restored ({hit_rate}), {totals.remote_hits} of them from the remote cache, {totals.stored} stored, {format_bytes(store.size())} in the store."
+    )
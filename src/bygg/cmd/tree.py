@@ -77,15 +77,26 @@ def tree_collect_for_environment(
 
     for entrypoint in entrypoints:
 
-        def format_children(name: str, last_sibling: bool, depth: int) -> list[str]:
+        def format_children(
+            name: str, last_sibling: bool, depth: int, ancestors: frozenset[str]
+        ) -> list[str]:
             action = ctx.scheduler.build_actions[name]
             display_name = f"{TS.BOLD}{name}{TS.RESET}" if depth == 0 else name
 
+            # Don't descend into dependency cycles
+            is_cycle = name in ancestors
+            if is_cycle:
+                display_name += " (cycle)"
+            ancestors = ancestors | {name}
+
             # Format children and flatten:
             children = itertools.chain.from_iterable(
                 (
-                    format_children(dep, i == len(action.dependencies) - 1, depth + 1)
+                    format_children(
+                        dep, i == len(action.dependencies) - 1, depth + 1, ancestors
+                    )
                     for i, dep in enumerate(sorted(action.dependencies))
+                    if not is_cycle
                 )
             )
 
@@ -100,7 +111,7 @@ def tree_collect_for_environment(
             return subtree
 
         formatted_data[entrypoint.name] = "\n".join(
-            format_children(entrypoint.name, True, 0)
+            format_children(entrypoint.name, True, 0, frozenset())
         )
 
     return SubProcessIpcDataTree(actions=formatted_data)
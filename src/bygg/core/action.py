@@ -1,6 +1,15 @@
 from dataclasses import dataclass
+import inspect
 from pathlib import Path
-from typing import TYPE_CHECKING, Callable, Iterable, Literal, Optional, Self
+from typing import (
+    TYPE_CHECKING,
+    Awaitable,
+    Callable,
+    Iterable,
+    Literal,
+    Optional,
+    Self,
+)
 
 from bygg.core.common_types import CommandStatus
 from bygg.logutils import logger
@@ -8,7 +17,7 @@ from bygg.logutils import logger
 if TYPE_CHECKING:
     from bygg.core.scheduler import Scheduler
 
-SchedulingType = Literal["in-process", "processpool"]
+SchedulingType = Literal["in-process", "processpool", "thread", "async"]
 
 # Function that returns a string that is included in the dependency digest. Returning
 # None causes the value to be ignored.
@@ -43,7 +52,9 @@ class ActionContext:
     scheduling_type: SchedulingType
 
 
-Command = Callable[[ActionContext], CommandStatus]
+SyncCommand = Callable[[ActionContext], CommandStatus]
+AsyncCommand = Callable[[ActionContext], Awaitable[CommandStatus]]
+Command = SyncCommand | AsyncCommand
 
 
 class Action(ActionContext):
@@ -67,11 +78,17 @@ class Action(ActionContext):
     is_entrypoint : bool, optional
         Whether this action is an entrypoint to the build graph. Default is False.
     command : Command, optional
-        Function to run. Default is None.
+        Function to run, or an async function to run on the runner's event loop.
+        Default is None.
     scheduling_type : SchedulingType, optional
-        The scheduling type for the action. Default is "processpool". Use "in-process"
-        for small Python functions that finish quickly so that they can be run in the
-        main process.
+        The scheduling type for the action. Default is "async" for async functions and
+        "processpool" for other commands. Use "in-process" for small Python functions
+        that finish quickly so that they can be run on a thread in the main process,
+        one at a time. Use "thread" for actions that mostly wait for subprocesses or the
+        network, so that they can be run on a thread pool in the main process. Use
+        "async" for shell commands from create_shell_command, which are then run as
+        asyncio subprocesses without a worker each. Async functions can be used with the
+        other scheduling types too, but they then occupy a worker while they wait.
     work_channel: WorkChannel, optional
         A WorkChannel that the action should run in. Default is None.
     description : str, optional
@@ -97,7 +114,7 @@ class Action(ActionContext):
         dynamic_dependency: Optional[DynamicDependency] = None,
         is_entrypoint: bool = False,
         command: Command | None = None,
-        scheduling_type: SchedulingType = "processpool",
+        scheduling_type: SchedulingType | None = None,
         work_channel: Optional[WorkChannel] = None,
         description: str | None = None,
         environment: Optional[str] = None,
@@ -112,7 +129,9 @@ class Action(ActionContext):
         self.dynamic_dependency = dynamic_dependency
         self.is_entrypoint = is_entrypoint
         self.command = command
-        self.scheduling_type = scheduling_type
+        self.scheduling_type = scheduling_type or (
+            "async" if inspect.iscoroutinefunction(command) else "processpool"
+        )
         self.work_channel = work_channel
 
         self.description = (
@@ -151,7 +170,7 @@ def action(
     outputs: Optional[Iterable[str | Path]] = None,
     dependencies: Optional[Iterable[str | Action]] = None,
     dynamic_dependency: Optional[DynamicDependency] = None,
-    scheduling_type: SchedulingType = "processpool",
+    scheduling_type: SchedulingType | None = None,
     work_channel: Optional[WorkChannel] = None,
     is_entrypoint: bool = False,
 ):
@@ -176,9 +195,14 @@ def action(
     is_entrypoint : bool, optional
         Whether the action is an entrypoint, by default False
     scheduling_type : SchedulingType, optional
-        The scheduling type for the action. Default is "processpool". Use "in-process"
-        for small Python functions that finish quickly so that they can be run in the
-        main process.
+        The scheduling type for the action. Default is "async" for async functions and
+        "processpool" for other commands. Use "in-process" for small Python functions
+        that finish quickly so that they can be run on a thread in the main process,
+        one at a time. Use "thread" for actions that mostly wait for subprocesses or the
+        network, so that they can be run on a thread pool in the main process. Use
+        "async" for shell commands from create_shell_command, which are then run as
+        asyncio subprocesses without a worker each. Async functions can be used with the
+        other scheduling types too, but they then occupy a worker while they wait.
     description : str, optional
         A description of the action, by default None
 
@@ -203,3 +227,19 @@ def action(
         )
 
     return create_action
+
+
+def preload_modules(*module_names: str):
+    """
+    Import the given modules in the main process before the worker processes are
+    started, so that the workers share them instead of importing them when they run
+    their first job. Useful for heavy modules that the actions import. The same as
+    preload_modules in the settings of Byggfile.toml.
+
+    Parameters
+    ----------
+    module_names : str
+        The names of the modules, e.g. "numpy".
+    """
+    assert Action.scheduler
+    Action.scheduler.preload_modules.update(module_names)
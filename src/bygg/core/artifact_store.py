@@ -0,0 +1,251 @@
+from concurrent.futures import Future
+from dataclasses import dataclass
+import os
+from pathlib import Path
+import pickle
+import shutil
+
+from bygg.core.digest import calculate_file_digest
+from bygg.core.remote_cache import RemoteArtifactCache
+from bygg.core.scaffolding import (
+    STATUS_DIR,
+    locked_status_file,
+    write_pickle_atomically,
+)
+from bygg.logutils import logger
+
+DEFAULT_ARTIFACT_STORE_DIR = STATUS_DIR / "cas"
+
+# The store is trimmed to this size at the end of each run, least recently used first
+DEFAULT_ARTIFACT_STORE_SIZE = 5 * 1024**3
+
+
+@dataclass
+class ArtifactStoreStats:
+    hits: int = 0
+    misses: int = 0
+    stored: int = 0
+    # Hits that were downloaded from the remote cache, included in hits
+    remote_hits: int = 0
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for the outputs of actions. The outputs are stored as blobs
+    named by their digests in objects/, and each stored job has a manifest in entries/
+    that maps its output paths to blobs. The key of a manifest is calculated by the
+    caller from everything that determines the outputs of the job.
+
+    Restored outputs are hardlinked to the blobs when possible, otherwise copied. Blobs
+    are verified before they are restored, so a blob that was modified through a
+    hardlinked output is discarded instead of restored.
+
+    If a remote cache is given, entries that are not in the local store are downloaded
+    from it, and stored entries are uploaded to it in the background. Downloads can also
+    be done in the background with fetch_in_background before restoring.
+    """
+
+    root: Path
+    max_size: int
+    remote: RemoteArtifactCache | None
+    # Counters for this run
+    stats: ArtifactStoreStats
+    # The keys that have been looked up in the remote cache in this run, and whether
+    # their entries were downloaded
+    fetched_keys: dict[str, bool]
+
+    def __init__(
+        self,
+        root: Path = DEFAULT_ARTIFACT_STORE_DIR,
+        max_size: int = DEFAULT_ARTIFACT_STORE_SIZE,
+        remote: RemoteArtifactCache | None = None,
+    ):
+        self.root = root
+        self.max_size = max_size
+        self.remote = remote
+        self.stats = ArtifactStoreStats()
+        self.fetched_keys = {}
+
+    @classmethod
+    def reset(cls):
+        shutil.rmtree(DEFAULT_ARTIFACT_STORE_DIR, ignore_errors=True)
+
+    @property
+    def objects_dir(self) -> Path:
+        return self.root / "objects"
+
+    @property
+    def entries_dir(self) -> Path:
+        return self.root / "entries"
+
+    @property
+    def stats_file(self) -> Path:
+        return self.root / "stats.db"
+
+    def read_manifest(self, key: str) -> dict[str, str] | None:
+        try:
+            with open(self.entries_dir / key, "rb") as f:
+                return pickle.load(f)
+        except (EOFError, FileNotFoundError, pickle.UnpicklingError):
+            return None
+
+    def is_stored(self, key: str) -> bool:
+        return (self.entries_dir / key).exists()
+
+    def can_fetch(self, key: str) -> bool:
+        """True if key is not in the local store, but might be in the remote cache."""
+        return (
+            self.remote is not None
+            and self.remote.available
+            and key not in self.fetched_keys
+            and not self.is_stored(key)
+        )
+
+    def fetch(self, key: str) -> bool:
+        """
+        Download the entry for key from the remote cache to the local store. Returns
+        False if it's not in the remote cache.
+        """
+        assert self.remote
+        manifest = self.remote.fetch(key, self.objects_dir)
+        if manifest is not None:
+            self.entries_dir.mkdir(parents=True, exist_ok=True)
+            write_pickle_atomically(self.entries_dir / key, manifest)
+        self.fetched_keys[key] = manifest is not None
+        return manifest is not None
+
+    def fetch_in_background(self, key: str) -> "Future[bool]":
+        """Like fetch, but on a background thread, see RemoteArtifactCache.submit."""
+        assert self.remote
+        return self.remote.submit(self.fetch, key)
+
+    def restore(self, key: str, outputs: set[str]) -> bool:
+        """
+        Restore the outputs stored under key. Returns False if they're not stored. If
+        they're not in the local store, they're downloaded from the remote cache first.
+        """
+        if self.can_fetch(key):
+            self.fetch(key)
+        manifest = self.read_manifest(key)
+        if manifest is None or set(manifest) != outputs:
+            self.stats.misses += 1
+            return False
+
+        for digest in manifest.values():
+            if calculate_file_digest(self.objects_dir / digest) != digest:
+                logger.info("Artifact store: discarding modified blob %s", digest)
+                (self.objects_dir / digest).unlink(missing_ok=True)
+                (self.entries_dir / key).unlink(missing_ok=True)
+                self.stats.misses += 1
+                return False
+
+        if self.fetched_keys.get(key):
+            self.stats.remote_hits += 1
+
+        for output, digest in manifest.items():
+            place_file(self.objects_dir / digest, Path(output), hardlink=True)
+        # The modification time of the manifest is used for the LRU eviction
+        os.utime(self.entries_dir / key)
+        self.stats.hits += 1
+        return True
+
+    def store(self, key: str, outputs: set[str]) -> bool:
+        """Store the outputs under key. Returns False if they can't be stored."""
+        manifest: dict[str, str] = {}
+        for output in outputs:
+            if not os.path.isfile(output):
+                # Missing outputs and directories are not stored
+                return False
+            digest = calculate_file_digest(output)
+            assert digest
+            manifest[output] = digest
+
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+        for output, digest in manifest.items():
+            blob = self.objects_dir / digest
+            if not blob.exists():
+                # Copy, so that the blob isn't changed if the output is written later
+                place_file(Path(output), blob, hardlink=False)
+        write_pickle_atomically(self.entries_dir / key, manifest)
+        self.stats.stored += 1
+        if self.remote:
+            self.remote.submit(self.remote.upload, key, manifest, self.objects_dir)
+        return True
+
+    def save(self):
+        """
+        Wait for the transfers to the remote cache, add the counters from this run to the
+        totals, and trim the store.
+        """
+        if self.remote:
+            # The blobs that are uploaded must not be evicted before they're sent
+            self.remote.wait()
+        if not self.root.exists():
+            return
+        with locked_status_file(self.stats_file):
+            totals = self.read_totals()
+            totals.hits += self.stats.hits
+            totals.misses += self.stats.misses
+            totals.stored += self.stats.stored
+            totals.remote_hits += self.stats.remote_hits
+            write_pickle_atomically(self.stats_file, totals)
+            if self.stats.stored or self.stats.remote_hits:
+                self.evict()
+        self.stats = ArtifactStoreStats()
+
+    def read_totals(self) -> ArtifactStoreStats:
+        try:
+            with open(self.stats_file, "rb") as f:
+                return pickle.load(f)
+        except (EOFError, FileNotFoundError, pickle.UnpicklingError):
+            return ArtifactStoreStats()
+
+    def size(self) -> int:
+        """The total size of the stored blobs."""
+        if not self.objects_dir.exists():
+            return 0
+        return sum(b.stat().st_size for b in self.objects_dir.iterdir())
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the blobs fit in max_size, and
+        then the blobs that are no longer used by any entry.
+        """
+        entries = sorted(
+            self.entries_dir.iterdir(), key=lambda e: e.stat().st_mtime, reverse=True
+        )
+        blob_sizes = {b.name: b.stat().st_size for b in self.objects_dir.iterdir()}
+
+        kept_blobs: set[str] = set()
+        size = 0
+        for entry in entries:
+            manifest = self.read_manifest(entry.name) or {}
+            new_blobs = set(manifest.values()) - kept_blobs
+            entry_size = sum(blob_sizes.get(b, 0) for b in new_blobs)
+            if not manifest or size + entry_size > self.max_size:
+                logger.info("Artifact store: evicting %s", entry.name)
+                entry.unlink(missing_ok=True)
+                continue
+            size += entry_size
+            kept_blobs |= new_blobs
+
+        for blob in blob_sizes.keys() - kept_blobs:
+            (self.objects_dir / blob).unlink(missing_ok=True)
+
+
+def place_file(source: Path, target: Path, hardlink: bool):
+    """Replace target with a hardlink to or a copy of source."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    tmp_file.unlink(missing_ok=True)
+    if hardlink:
+        try:
+            os.link(source, tmp_file)
+            os.replace(tmp_file, target)
+            return
+        except OSError:
+            # E.g. on another file system
+            pass
+    shutil.copy2(source, tmp_file)
+    os.replace(tmp_file, target)
@@ -0,0 +1,62 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Coroutine, TypeVar
+
+T = TypeVar("T")
+
+
+class AsyncEngine:
+    """
+    An asyncio event loop in a thread of its own, for jobs that mostly wait for
+    subprocesses. Any number of such jobs can run at the same time without a worker
+    each. Coroutines are submitted from the runner's thread, and their results are
+    delivered through concurrent.futures.Future objects, like from the other pools.
+
+    The loop is started by the first submit. Shutting down cancels the coroutines that
+    are still running.
+    """
+
+    loop: asyncio.AbstractEventLoop | None
+    thread: threading.Thread | None
+
+    def __init__(self):
+        self.loop = None
+        self.thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def start(self):
+        if self.loop is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="bygg-async", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, coroutine: Coroutine[Any, Any, T]) -> concurrent.futures.Future[T]:
+        self.start()
+        assert self.loop is not None
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def shutdown(self):
+        if self.loop is None or self.thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(cancel_all_tasks(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+        self.thread = None
+
+
+async def cancel_all_tasks():
+    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,11 +1,26 @@
+from collections.abc import Iterator, MutableMapping
 from dataclasses import dataclass
 from pathlib import Path
 import pickle
+import sqlite3
+import time
 
-from bygg.core.scaffolding import STATUS_DIR, make_sure_status_dir_exists
+from bygg.core.scaffolding import (
+    STATUS_DIR,
+    locked_status_file,
+    make_sure_status_dir_exists,
+)
 
 DEFAULT_DB_FILE = STATUS_DIR / "cache.db"
 
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+# Seconds to wait for another bygg process to finish writing to the cache
+CACHE_BUSY_TIMEOUT = 60.0
+
+# Seconds between commits of the finished jobs' digests during a run
+CACHE_COMMIT_INTERVAL = 1.0
+
 
 @dataclass
 class InputsOutputsDigests:
@@ -16,36 +31,189 @@ class InputsOutputsDigests:
 
 @dataclass
 class CacheState:
-    digests: dict[str, InputsOutputsDigests]
+    digests: MutableMapping[str, InputsOutputsDigests]
+
+
+class SqliteDigests(MutableMapping[str, InputsOutputsDigests]):
+    """
+    The digests of each action, stored in an SQLite database. Rows are looked up on
+    demand, and changes are kept in memory until they are written in one transaction by
+    commit() or flush().
+
+    The database is in WAL mode, so a commit is an append to the write-ahead log, which
+    SQLite replays after a crash and folds into the database when it is closed.
+    """
+
+    db_file: Path
+    connection: sqlite3.Connection | None
+    # Rows that have been read, None for actions that are not in the database
+    loaded: dict[str, InputsOutputsDigests | None]
+    # Changes that have not been written yet, None for removed actions
+    changed: dict[str, InputsOutputsDigests | None]
+
+    def __init__(self, db_file: Path):
+        self.db_file = db_file
+        self.connection = None
+        self.loaded = {}
+        self.changed = {}
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            # Several bygg processes can use the same database; SQLite locks it
+            # while writing and only the changed rows are written.
+            self.connection = sqlite3.connect(self.db_file, timeout=CACHE_BUSY_TIMEOUT)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS digests (
+                    name TEXT PRIMARY KEY,
+                    inputs_digest TEXT NOT NULL,
+                    outputs_digest TEXT NOT NULL,
+                    dynamic_digest TEXT
+                )
+                """
+            )
+        return self.connection
+
+    def lookup(self, name: str) -> InputsOutputsDigests | None:
+        if name in self.changed:
+            return self.changed[name]
+        if name not in self.loaded:
+            row = (
+                self.connect()
+                .execute(
+                    "SELECT inputs_digest, outputs_digest, dynamic_digest FROM digests WHERE name = ?",
+                    (name,),
+                )
+                .fetchone()
+            )
+            self.loaded[name] = InputsOutputsDigests(*row) if row else None
+        return self.loaded[name]
+
+    def __getitem__(self, name: str) -> InputsOutputsDigests:
+        digests = self.lookup(name)
+        if digests is None:
+            raise KeyError(name)
+        return digests
+
+    def __setitem__(self, name: str, digests: InputsOutputsDigests):
+        self.changed[name] = digests
+
+    def __delitem__(self, name: str):
+        if self.lookup(name) is None:
+            raise KeyError(name)
+        self.changed[name] = None
+
+    def __iter__(self) -> Iterator[str]:
+        names = {row[0] for row in self.connect().execute("SELECT name FROM digests")}
+        for name, digests in self.changed.items():
+            if digests is None:
+                names.discard(name)
+            else:
+                names.add(name)
+        return iter(names)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def commit(self):
+        """Write the changes, keeping the database open."""
+        if self.changed:
+            connection = self.connect()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?)",
+                    [
+                        (name, d.inputs_digest, d.outputs_digest, d.dynamic_digest)
+                        for name, d in self.changed.items()
+                        if d is not None
+                    ],
+                )
+                connection.executemany(
+                    "DELETE FROM digests WHERE name = ?",
+                    [(name,) for name, d in self.changed.items() if d is None],
+                )
+            self.loaded.update(self.changed)
+            self.changed = {}
+
+    def flush(self):
+        """Write the changes and close the database until it's needed again."""
+        self.commit()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def read_legacy_cache(db_file: Path) -> CacheState | None:
+    """
+    Earlier versions pickled the whole CacheState to the cache file. Read such a file
+    and remove it, so that the database can be created in its place.
+    """
+    try:
+        with open(db_file, "rb") as f:
+            header = f.read(len(SQLITE_HEADER))
+            if not header or header == SQLITE_HEADER:
+                return None
+            f.seek(0)
+            state = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (EOFError, pickle.UnpicklingError, AttributeError):
+        # Not something we can migrate; start over
+        state = None
+    db_file.unlink()
+    return state if isinstance(state, CacheState) else None
 
 
 class Cache:
     data: CacheState | None
     db_file: Path
+    commit_interval: float
+    last_commit: float
 
     def __init__(self, db_file: Path = DEFAULT_DB_FILE):
         self.data = CacheState({})
         self.db_file = db_file
+        self.commit_interval = CACHE_COMMIT_INTERVAL
+        self.last_commit = time.monotonic()
 
     @classmethod
     def reset(cls):
-        DEFAULT_DB_FILE.unlink(missing_ok=True)
+        for suffix in ("", "-wal", "-shm"):
+            DEFAULT_DB_FILE.with_name(DEFAULT_DB_FILE.name + suffix).unlink(
+                missing_ok=True
+            )
 
     def load(self):
         make_sure_status_dir_exists()
-        try:
-            with open(self.db_file, "rb") as f:
-                self.data = pickle.load(f)
-        except (EOFError, FileNotFoundError):
-            self.data = CacheState({})
+        digests = SqliteDigests(self.db_file)
+        with locked_status_file(self.db_file):
+            legacy_state = read_legacy_cache(self.db_file)
+            if legacy_state:
+                digests.update(legacy_state.digests)
+                digests.flush()
+        self.data = CacheState(digests)
+        self.last_commit = time.monotonic()
+
+    def commit_if_due(self):
+        """
+        Commit the changes if it's more than commit_interval seconds since the last
+        commit. Called as jobs finish, so that an interrupted build only needs to redo
+        the jobs that hadn't finished.
+        """
+        if not self.data or not isinstance(self.data.digests, SqliteDigests):
+            return
+        now = time.monotonic()
+        if now - self.last_commit >= self.commit_interval:
+            self.data.digests.commit()
+            self.last_commit = now
 
     def save(self):
         if not self.data:
             return
-        make_sure_status_dir_exists()
-        with open(self.db_file, "wb") as f:
-            pickle.dump(self.data, f)
-        # print(f"Cache: {self.data.digests}")
+        if isinstance(self.data.digests, SqliteDigests):
+            self.data.digests.flush()
 
     def get_digests(self, name: str) -> InputsOutputsDigests | None:
         if not self.data:
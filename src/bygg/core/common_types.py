@@ -12,6 +12,7 @@ class CommandStatus:
     message: str | None = None  # a message to display to the user
     output: str | None = None  # output of the command
     runner_instruction: RunnerInstruction | None = None  # instruction to the runner
+    log_file: str | None = None  # file with the full output, if output is a tail
 
 
 JobStatus = Literal["queued", "running", "finished", "failed", "stopped", "skipped"]
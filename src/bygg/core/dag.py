@@ -25,6 +25,9 @@ class Dag(metaclass=ABCMeta):
     @abstractmethod
     def get_all_jobs(self) -> Iterable[str]: ...
 
+    def get_topological_order(self) -> list[str]:
+        return []
+
 
 class ByggDag(Dag):
     nodes: dict[str, set[str]]
@@ -42,8 +45,12 @@ class ByggDag(Dag):
         self.nodes.pop(node, None)
 
     def build_action_graph(self, build_actions: dict[str, Action], action: Action):
-        """Build the action graph."""
+        """Build the action graph. Each action is only visited once, so shared
+        dependencies are not expanded again for every path that leads to them."""
+        if action.name in self.nodes:
+            return
         queue = deque([action])
+        visited = {action.name}
         while len(queue) > 0:
             a = queue.popleft()
             self.nodes[a.name] = set()
@@ -51,8 +58,10 @@ class ByggDag(Dag):
                 dependency_action = build_actions.get(dependency)
                 if not dependency_action:
                     raise ValueError(f"Action '{dependency}' not found")
-                queue.append(dependency_action)
                 self.nodes[a.name].add(dependency)
+                if dependency not in visited and dependency not in self.nodes:
+                    visited.add(dependency)
+                    queue.append(dependency_action)
 
     def get_ready_jobs(
         self,
@@ -75,6 +84,117 @@ class ByggDag(Dag):
     def get_all_jobs(self) -> Iterable[str]:
         return self.nodes.keys()
 
+    def get_topological_order(self) -> list[str]:
+        """
+        Return the nodes ordered so that every node comes after all of its
+        dependencies. Raises ValueError with the offending path if the graph contains
+        a cycle.
+        """
+        order: list[str] = []
+        done: set[str] = set()
+
+        for root in sorted(self.nodes):
+            if root in done:
+                continue
+            # Iterative depth-first search; path holds the nodes currently being
+            # expanded, in the same order as the iterators on the stack.
+            path = [root]
+            on_path = {root}
+            stack = [iter(sorted(self.nodes[root]))]
+            while stack:
+                child = next(stack[-1], None)
+                if child is None:
+                    node = path.pop()
+                    on_path.remove(node)
+                    stack.pop()
+                    done.add(node)
+                    order.append(node)
+                    continue
+                if child in done or child not in self.nodes:
+                    continue
+                if child in on_path:
+                    cycle = path[path.index(child) :] + [child]
+                    raise ValueError(f"Dependency cycle detected: {' -> '.join(cycle)}")
+                path.append(child)
+                on_path.add(child)
+                stack.append(iter(sorted(self.nodes[child])))
+
+        return order
+
+
+class IncrementalDag(ByggDag):
+    """
+    A ByggDag that keeps reverse edges and a count of unfinished dependencies for each
+    node, so that finding the ready nodes doesn't require scanning the whole graph.
+
+    Removing a node decrements the counters of its dependents and queues the ones that
+    become unblocked, which is O(out-degree). Nodes that are never removed (i.e. failed
+    jobs) keep blocking their dependents, just like in ByggDag.
+    """
+
+    dependents: dict[str, set[str]]
+    pending_counts: dict[str, int]
+    ready_queue: deque[str]
+
+    def __init__(self):
+        super().__init__()
+        self.dependents = {}
+        self.pending_counts = {}
+        self.ready_queue = deque()
+
+    def clear(self):
+        super().clear()
+        self.dependents.clear()
+        self.pending_counts.clear()
+        self.ready_queue.clear()
+
+    def remove_node(self, node: str):
+        if self.nodes.pop(node, None) is None:
+            return
+        for dependent in self.dependents.pop(node, set()):
+            if dependent not in self.nodes:
+                continue
+            self.pending_counts[dependent] -= 1
+            if self.pending_counts[dependent] == 0:
+                self.ready_queue.append(dependent)
+
+    def build_action_graph(self, build_actions: dict[str, Action], action: Action):
+        super().build_action_graph(build_actions, action)
+        self.index_graph()
+
+    def index_graph(self):
+        """Recreate the reverse edges, counters and the ready queue from the nodes."""
+        self.dependents = {node: set() for node in self.nodes}
+        self.pending_counts = {}
+        self.ready_queue.clear()
+        for node, dependencies in self.nodes.items():
+            pending = 0
+            for dependency in dependencies:
+                if dependency in self.nodes:
+                    self.dependents[dependency].add(node)
+                    pending += 1
+            self.pending_counts[node] = pending
+            if pending == 0:
+                self.ready_queue.append(node)
+
+    def get_ready_jobs(
+        self,
+        finished_jobs: dict[str, Any],
+        running_jobs: dict[str, Any],
+    ) -> list[str]:
+        # Each node is handed out once; the caller is expected to either run it or
+        # skip it.
+        ready_jobs = []
+        while self.ready_queue:
+            node = self.ready_queue.popleft()
+            if (
+                node in self.nodes
+                and node not in finished_jobs
+                and node not in running_jobs
+            ):
+                ready_jobs.append(node)
+        return ready_jobs
+
 
 def create_dag() -> Dag:
-    return ByggDag()
+    return IncrementalDag()
@@ -1,32 +1,120 @@
-import dis
-import functools
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 import hashlib
-import io
 import os
 from pathlib import Path
-from typing import Callable
+import pickle
+from types import CodeType
+from typing import Callable, TypeAlias
+
+from bygg.core.scaffolding import (
+    STATUS_DIR,
+    locked_status_file,
+    write_pickle_atomically,
+)
 
 DIGEST_TYPE = "sha1"
 
-# If True, cache the file digest in memory based on the filename, stat.ctime_ns,
-# stat.mtime_ns and stat.size of the file.
+# If True, cache the file digest based on the filename, stat.st_ino, stat.ctime_ns,
+# stat.mtime_ns and stat.size of the file. The cache is kept in .bygg between runs.
 ALLOW_DIGEST_CACHING = True
 
+DEFAULT_DIGESTS_FILE = STATUS_DIR / "digests.db"
+
+# Default number of threads for calculating file digests concurrently
+DEFAULT_DIGEST_JOBS = min(32, (os.cpu_count() or 1) + 4)
+
+# st_ino, st_size, st_mtime_ns, st_ctime_ns
+StatKey: TypeAlias = tuple[int, int, int, int]
+
+
+class FileDigestCache:
+    """
+    Digests of files keyed on the path and the stat results of the file. The digests
+    are loaded on first use and saved at the end of the run, so that files that haven't
+    changed since an earlier run only need to be stat'ed.
+    """
+
+    digests_file: Path
+    entries: dict[str, tuple[StatKey, str]] | None
+    # Entries that were added in this run
+    updated: dict[str, tuple[StatKey, str]]
+
+    def __init__(self, digests_file: Path = DEFAULT_DIGESTS_FILE):
+        self.use_file(digests_file)
+
+    @classmethod
+    def reset(cls):
+        DEFAULT_DIGESTS_FILE.unlink(missing_ok=True)
+
+    def use_file(self, digests_file: Path):
+        self.digests_file = digests_file
+        self.entries = None
+        self.updated = {}
+
+    def read_file(self) -> dict[str, tuple[StatKey, str]]:
+        try:
+            with open(self.digests_file, "rb") as f:
+                return pickle.load(f)
+        except (EOFError, FileNotFoundError, pickle.UnpicklingError):
+            return {}
+
+    def load_if_needed(self) -> dict[str, tuple[StatKey, str]]:
+        if self.entries is None:
+            self.entries = self.read_file()
+        return self.entries
+
+    def get(self, file: str, key: StatKey) -> str | None:
+        entry = self.load_if_needed().get(file)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        return None
+
+    def set(self, file: str, key: StatKey, digest: str):
+        self.load_if_needed()[file] = self.updated[file] = (key, digest)
+
+    def save(self):
+        """
+        Merge the digests from this run into the digests file, which may have been
+        updated by other bygg processes in the meantime, and evict the files that no
+        longer exist.
+        """
+        if not self.updated:
+            return
+        with locked_status_file(self.digests_file):
+            entries = self.read_file()
+            entries.update(self.updated)
+            entries = {
+                file: entry
+                for file, entry in entries.items()
+                if file in self.updated or os.path.isfile(file)
+            }
+            write_pickle_atomically(self.digests_file, entries)
+        self.entries = entries
+        self.updated = {}
+
+
+file_digest_cache = FileDigestCache()
+
 
 def file_digest(file: str | Path) -> str:
     with open(file, "rb") as f:
         return hashlib.file_digest(f, DIGEST_TYPE).hexdigest()
 
 
-@functools.cache
 def file_digest_memo(
-    file: str, st_ctime_ns: int, st_mtime_ns: int, st_size: int
+    file: str, st_ctime_ns: int, st_mtime_ns: int, st_size: int, st_ino: int = 0
 ) -> str:
     """
-    Cache a file's digest based on the content, stat.ctime_ns, stat.mtime_ns and
-    stat.size of the file.
+    Cache a file's digest based on the path, stat.st_ino, stat.ctime_ns, stat.mtime_ns
+    and stat.size of the file.
     """
-    return file_digest(file)
+    key = (st_ino, st_size, st_mtime_ns, st_ctime_ns)
+    digest = file_digest_cache.get(file, key)
+    if digest is None:
+        digest = file_digest(file)
+        file_digest_cache.set(file, key, digest)
+    return digest
 
 
 def calculate_file_digest(file: str | Path) -> str | None:
@@ -42,7 +130,7 @@ def calculate_file_digest(file: str | Path) -> str | None:
         if ALLOW_DIGEST_CACHING:
             st = os.stat(real_path)
             return file_digest_memo(
-                real_path, st.st_ctime_ns, st.st_mtime_ns, st.st_size
+                real_path, st.st_ctime_ns, st.st_mtime_ns, st.st_size, st.st_ino
             )
         return file_digest(real_path)
 
@@ -50,14 +138,70 @@ def calculate_file_digest(file: str | Path) -> str | None:
         return "directory"
 
 
-def calculate_dependency_digest(filenames: set[str] | set[Path]) -> tuple[str, bool]:
+def prefetch_file_digests(
+    files: Iterable[str], max_workers: int = DEFAULT_DIGEST_JOBS
+) -> dict[str, str | None]:
+    """
+    Calculate the digests of the files concurrently. hashlib releases the GIL while
+    hashing, so this scales with the number of threads. Returns the digests by file;
+    they also end up in the file digest cache.
+
+    The threads are stopped before returning, so that no threads are left running when
+    the runner forks its worker processes.
+    """
+    if not ALLOW_DIGEST_CACHING or max_workers <= 1:
+        return {}
+    # Load the cache before the threads start using it
+    file_digest_cache.load_if_needed()
+    files = list(files)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(files, executor.map(calculate_file_digest, files)))
+
+
+class DigestContext:
+    """
+    Digests calculated during one run. Each file is only hashed, or stat'ed, once per
+    run. Files that are written during the run need to be invalidated.
+    """
+
+    file_digests: dict[str, str | None]
+    # Digests of the results from the dynamic dependencies, by action
+    dynamic_digests: dict[str, str | None]
+
+    def __init__(self):
+        self.file_digests = {}
+        self.dynamic_digests = {}
+
+    def clear(self):
+        self.file_digests.clear()
+        self.dynamic_digests.clear()
+
+    def file_digest(self, file: str | Path) -> str | None:
+        key = str(file)
+        if key not in self.file_digests:
+            self.file_digests[key] = calculate_file_digest(file)
+        return self.file_digests[key]
+
+    def dependency_digest(self, filenames: set[str] | set[Path]) -> tuple[str, bool]:
+        return calculate_dependency_digest(filenames, self.file_digest)
+
+    def invalidate(self, files: Iterable[str]):
+        for file in files:
+            self.file_digests.pop(file, None)
+
+
+def calculate_dependency_digest(
+    filenames: set[str] | set[Path],
+    digest_function: Callable[[str | Path], str | None] = calculate_file_digest,
+) -> tuple[str, bool]:
     """
     Calculate the digest of a set of files.
     filenames: The files to calculate the digest of.
+    digest_function: The function used to calculate the digest of each file.
     Returns: The digest of the files as a hex string.
     """
 
-    file_digests = [calculate_file_digest(filename) for filename in filenames]
+    file_digests = [digest_function(filename) for filename in filenames]
     digests = sorted(filter(None, file_digests))
     files_were_missing = len(file_digests) != len(digests)
 
@@ -84,11 +228,34 @@ def calculate_function_digest(fn: Callable) -> str:
     fn: The function to calculate the digest of.
     Returns: The digest of the function as a hex string.
     """
-    # Just looking at the code object is not enough, so let's disassemble it.
-    out = io.StringIO()
-    dis.dis(fn, file=out)
-    function_dis_string = out.getvalue()
-    return hashlib.new(DIGEST_TYPE, function_dis_string.encode()).hexdigest()
+    hasher = hashlib.new(DIGEST_TYPE)
+    update_code_digest(hasher, fn.__code__)  # type: ignore[attr-defined]
+    return hasher.hexdigest()
+
+
+def update_code_digest(hasher, code: CodeType):
+    """
+    Add a code object to the digest, including the code objects of nested functions,
+    lambdas and comprehensions. Only the parts that are the same in every process are
+    used, so not e.g. memory addresses or file names.
+    """
+    hasher.update(code.co_code)
+    hasher.update(repr((code.co_names, code.co_varnames, code.co_freevars)).encode())
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            hasher.update(b"code:")
+            update_code_digest(hasher, const)
+        else:
+            hasher.update(stable_repr(const).encode())
+
+
+def stable_repr(value) -> str:
+    """repr() that doesn't depend on the hash seed of the process for sets."""
+    if isinstance(value, (set, frozenset)):
+        return f"{type(value).__name__}({sorted(stable_repr(v) for v in value)})"
+    if isinstance(value, tuple):
+        return f"({', '.join(stable_repr(v) for v in value)},)"
+    return repr(value)
 
 
 def calculate_string_digest(s: str) -> str:
@@ -98,3 +265,40 @@ def calculate_string_digest(s: str) -> str:
     Returns: The digest of the string as a hex string.
     """
     return hashlib.new(DIGEST_TYPE, s.encode()).hexdigest()
+
+
+def calculate_command_digest(fn: Callable) -> str:
+    """
+    Calculate the digest of a command function, including the values that it closes
+    over. This makes the digest of e.g. a shell command depend on the shell string. For
+    callable objects, the digest includes the attributes of the object.
+    """
+    items: list[str] = []
+    functions = [fn]
+    seen: set[int] = set()
+    while functions:
+        f = functions.pop()
+        if id(f) in seen:
+            continue
+        seen.add(id(f))
+        if hasattr(f, "__code__"):
+            items.append(calculate_function_digest(f))
+            values = []
+            for cell in getattr(f, "__closure__", None) or ():
+                try:
+                    values.append(cell.cell_contents)
+                except ValueError:
+                    # Empty cell
+                    continue
+        else:
+            items.append(type(f).__qualname__)
+            call = getattr(type(f), "__call__", None)
+            if callable(call) and hasattr(call, "__code__"):
+                functions.append(call)
+            values = list(vars(f).values()) if hasattr(f, "__dict__") else []
+        for value in values:
+            if hasattr(value, "__code__"):
+                functions.append(value)
+            elif isinstance(value, (str, int, float, bool, tuple, frozenset)):
+                items.append(stable_repr(value))
+    return calculate_digest(items)
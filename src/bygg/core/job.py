@@ -6,11 +6,18 @@ class Job:
     name: str
     action: Action
     status: CommandStatus | None
+    # Resource usage of the command: wall time and CPU time in seconds, peak RSS in bytes
+    duration: float | None
+    cpu_time: float | None
+    peak_rss: int | None
 
     def __init__(self, action: Action):
         self.name = action.name
         self.action = action
         self.status = None
+        self.duration = None
+        self.cpu_time = None
+        self.peak_rss = None
 
     def __repr__(self) -> str:
         return f'"{self.name}, status: {self.status.rc if self.status else "unknown"}"'
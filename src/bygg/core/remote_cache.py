@@ -0,0 +1,210 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import http.client
+import json
+import os
+from pathlib import Path
+import re
+import threading
+from typing import Callable, TypeVar
+import urllib.error
+import urllib.request
+
+from bygg.core.digest import DIGEST_TYPE
+from bygg.logutils import logger
+from bygg.output.output import output_warning
+
+# Number of simultaneous requests to the remote cache
+DEFAULT_REMOTE_CACHE_CONNECTIONS = 4
+
+# Seconds to wait for the remote cache before giving up on it
+REMOTE_CACHE_TIMEOUT = 10.0
+
+# Size of the chunks that are streamed to and from the remote cache
+TRANSFER_CHUNK_SIZE = 1024 * 1024
+
+# Keys and blob names are hex digests; anything else is not accepted from the server
+KEY_PATTERN = re.compile(r"[0-9a-f]{8,128}")
+
+T = TypeVar("T")
+
+
+class RemoteArtifactCache:
+    """
+    Client for an artifact cache that is shared over HTTP, e.g. between CI machines.
+    Blobs and manifests are stored like in the local ArtifactStore:
+
+        GET, HEAD and PUT <url>/cas/<digest>  the blob with the given content digest
+        GET and PUT <url>/ac/<key>            the manifest for an artifact key, a JSON
+                                              object that maps output paths to digests
+
+    GET and HEAD return 404 for things that are not stored. Blobs are uploaded before
+    the manifest that refers to them.
+
+    Transfers can be run in the background with submit, so that a slow server doesn't
+    hold up the caller. At most max_connections of them run at the same time.
+
+    If the server can't be reached, a warning is printed and the remote cache is not
+    used for the rest of the run. The build then works as without the remote cache.
+    """
+
+    url: str
+    max_connections: int
+    timeout: float
+    # False after a failed request
+    available: bool
+    # Runs the background transfers, created when first needed
+    executor: ThreadPoolExecutor | None
+    lock: threading.Lock
+
+    def __init__(
+        self,
+        url: str,
+        max_connections: int = DEFAULT_REMOTE_CACHE_CONNECTIONS,
+        timeout: float = REMOTE_CACHE_TIMEOUT,
+    ):
+        self.url = url.rstrip("/")
+        self.max_connections = max(max_connections, 1)
+        self.timeout = timeout
+        self.available = True
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def fetch(self, key: str, objects_dir: Path) -> dict[str, str] | None:
+        """
+        Download the manifest for key and the blobs that are missing in objects_dir.
+        Returns the manifest, or None if it's not in the remote cache.
+        """
+        manifest = self.call(lambda: self.get_manifest(key))
+        if not manifest:
+            return None
+        missing = [d for d in set(manifest.values()) if not (objects_dir / d).exists()]
+        objects_dir.mkdir(parents=True, exist_ok=True)
+        downloaded = self.call(
+            lambda: all(self.download_blob(d, objects_dir / d) for d in missing)
+        )
+        return manifest if downloaded else None
+
+    def upload(self, key: str, manifest: dict[str, str], objects_dir: Path):
+        """Upload the blobs that the server doesn't have, and then the manifest."""
+
+        def upload_all():
+            for digest in set(manifest.values()):
+                if not self.has_blob(digest):
+                    self.upload_blob(digest, objects_dir / digest)
+            self.put_manifest(key, manifest)
+
+        self.call(upload_all)
+
+    def submit(self, fn: Callable[..., T], *args) -> "Future[T]":
+        """Call fn in the background."""
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.max_connections,
+                    thread_name_prefix="bygg-remote-cache",
+                )
+            return self.executor.submit(fn, *args)
+
+    def wait(self):
+        """Wait for the background transfers to complete, and stop their threads."""
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def call(self, fn: Callable[[], T]) -> T | None:
+        """Call fn unless the remote cache has failed. Returns None if it fails."""
+        if not self.available:
+            return None
+        try:
+            return fn()
+        except (OSError, http.client.HTTPException) as e:
+            with self.lock:
+                # Only warn once when several transfers fail at the same time
+                if self.available:
+                    output_warning(f"Remote cache {self.url} is not available: {e}")
+                    self.available = False
+            return None
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        data=None,
+        headers: dict[str, str] | None = None,
+    ) -> http.client.HTTPResponse | None:
+        """Send a request. Returns None if the server doesn't have the resource."""
+        request = urllib.request.Request(
+            f"{self.url}/{path}", data=data, method=method, headers=headers or {}
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                e.close()
+                return None
+            raise
+
+    def get_manifest(self, key: str) -> dict[str, str] | None:
+        response = self.request("GET", f"ac/{key}")
+        if response is None:
+            return None
+        with response:
+            try:
+                manifest = json.load(response)
+            except ValueError:
+                manifest = None
+        if not isinstance(manifest, dict) or not all(
+            isinstance(d, str) and KEY_PATTERN.fullmatch(d) for d in manifest.values()
+        ):
+            logger.warning("Remote cache: ignoring invalid manifest for %s", key)
+            return None
+        return manifest
+
+    def put_manifest(self, key: str, manifest: dict[str, str]):
+        data = json.dumps(manifest).encode()
+        self.put(f"ac/{key}", data, {"Content-Type": "application/json"})
+
+    def has_blob(self, digest: str) -> bool:
+        response = self.request("HEAD", f"cas/{digest}")
+        if response is None:
+            return False
+        response.close()
+        return True
+
+    def download_blob(self, digest: str, target: Path) -> bool:
+        """Stream a blob to target. Returns False if it's missing or corrupt."""
+        response = self.request("GET", f"cas/{digest}")
+        if response is None:
+            return False
+        tmp_file = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        hasher = hashlib.new(DIGEST_TYPE)
+        with response, open(tmp_file, "wb") as f:
+            while chunk := response.read(TRANSFER_CHUNK_SIZE):
+                hasher.update(chunk)
+                f.write(chunk)
+        if hasher.hexdigest() != digest:
+            logger.warning("Remote cache: discarding corrupt blob %s", digest)
+            tmp_file.unlink(missing_ok=True)
+            return False
+        os.replace(tmp_file, target)
+        return True
+
+    def upload_blob(self, digest: str, source: Path):
+        """Stream a blob from source."""
+        with open(source, "rb") as f:
+            self.put(
+                f"cas/{digest}",
+                f,
+                {
+                    "Content-Length": str(os.fstat(f.fileno()).st_size),
+                    "Content-Type": "application/octet-stream",
+                },
+            )
+
+    def put(self, path: str, data, headers: dict[str, str]):
+        response = self.request("PUT", path, data, headers)
+        if response is None:
+            raise OSError(f"PUT {path} returned 404")
+        response.close()
@@ -1,20 +1,54 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+from dataclasses import dataclass
+import heapq
+import importlib
+import inspect
+import itertools
 import os
 from pathlib import Path
+import queue
+import resource
 import sys
-from typing import Callable
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable, Iterable, TypeVar
 import warnings
 
-from bygg.core.action import WorkChannel
+from bygg.core.action import Action, ActionContext, Command, WorkChannel
+from bygg.core.async_engine import AsyncEngine
 from bygg.core.common_types import CommandStatus, JobStatus
+from bygg.core.digest import (
+    calculate_command_digest,
+    calculate_digest,
+    calculate_file_digest,
+)
 from bygg.core.job import Job
 from bygg.core.scheduler import Scheduler
 from bygg.logutils import logger
 from bygg.output.output import TerminalStyle as TS
+from bygg.output.output import output_warning
 from bygg.output.status_display import on_check_failed
+from bygg.util import ShellCommand
+
+if TYPE_CHECKING:
+    from loky import ProcessPoolExecutor  # type: ignore
+
+T = TypeVar("T")
 
 JobStatusListener = Callable[[JobStatus, Job, tuple], None]
 RunnerStatusListener = Callable[[str], None]
 
+# Seconds between checks for interrupts while waiting for jobs to finish. Finished jobs
+# wake up the runner directly, so this doesn't delay the build.
+WAKEUP_INTERVAL = 1.0
+
+# Threads for jobs with the "in-process" scheduling type. One thread keeps such jobs
+# from running at the same time as each other, like when they were run by the runner
+# itself, while the runner keeps dispatching other jobs.
+IN_PROCESS_THREADS = 1
+
 
 # Suppress the specific loky warning about fork start method. The current runner
 # architecture depends on forking, and at least from what I can discern from reading in
@@ -26,80 +60,334 @@ warnings.filterwarnings(
 )
 
 
+class DispatchQueue:
+    """
+    The jobs that the runner has got from the scheduler but not started yet. Jobs that
+    can be started are kept in a heap, the one with the highest priority first. Jobs
+    whose work channel is full wait in a FIFO queue for the channel, and are moved to
+    the heap one at a time as jobs in the channel finish. Pushing and popping a job is
+    O(log n), and releasing its channel is O(log n).
+    """
+
+    # Heap of (-priority, insertion order, job)
+    ready: list[tuple[float, int, Job]]
+    # The heap entries of the jobs waiting for each work channel
+    channel_queues: dict[str, deque[tuple[float, int, Job]]]
+    waiting_count: int
+    counter: itertools.count
+    # Keep active WorkChannel objects here since the objects don't survive the
+    # serialisation pass intact.
+    work_channels: dict[str, WorkChannel]
+
+    def __init__(self):
+        self.ready = []
+        self.counter = itertools.count()
+        self.channel_queues = {}
+        self.waiting_count = 0
+        self.work_channels = {}
+
+    def __len__(self) -> int:
+        return len(self.ready) + self.waiting_count
+
+    def push(self, job: Job, priority: float = 0.0):
+        heapq.heappush(self.ready, (-priority, next(self.counter), job))
+
+    def pop(self) -> Job | None:
+        """
+        Pop the job with the highest priority that can be started, and reserve a place
+        for it in its work channel. Returns None if no job can be started.
+        """
+        while self.ready:
+            entry = heapq.heappop(self.ready)
+            job = entry[2]
+            work_channel = self.get_work_channel(job)
+            if work_channel is None:
+                return job
+            if len(work_channel.current_jobs) < work_channel.width:
+                logger.debug(
+                    "Work channel %s has room, adding job %s",
+                    work_channel.name,
+                    job.name,
+                )
+                work_channel.current_jobs.add(job.name)
+                return job
+            logger.debug(
+                "Work channel %s is full, job %s waits. Contents: %s",
+                work_channel.name,
+                job.name,
+                work_channel.current_jobs,
+            )
+            self.channel_queues.setdefault(work_channel.name, deque()).append(entry)
+            self.waiting_count += 1
+        return None
+
+    def release(self, job: Job):
+        """Release the job's place in its work channel, letting the next job in."""
+        work_channel = self.get_work_channel(job)
+        if work_channel is None or job.name not in work_channel.current_jobs:
+            return
+        work_channel.current_jobs.remove(job.name)
+        waiting = self.channel_queues.get(work_channel.name)
+        if waiting:
+            self.waiting_count -= 1
+            # With its original entry, so that it keeps its place among the other jobs
+            heapq.heappush(self.ready, waiting.popleft())
+
+    def get_work_channel(self, job: Job) -> WorkChannel | None:
+        if job.action.work_channel is None:
+            return None
+        return self.work_channels.setdefault(
+            job.action.work_channel.name, job.action.work_channel
+        )
+
+
+class WorkerPool:
+    """
+    Worker processes that are kept between runs, so that restarted builds, builds of
+    several actions and rebuilds in watch mode don't fork new workers each time.
+
+    The workers are forked with the actions that are registered at that point. They are
+    replaced when max_workers or the key changes, see calculate_worker_key, and when the
+    executor is broken, e.g. because a worker was killed, or has been shut down.
+    """
+
+    executor: "ProcessPoolExecutor | None"
+    max_workers: int
+    key: str | None
+
+    def __init__(self):
+        self.executor = None
+        self.max_workers = 0
+        self.key = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def get(
+        self, max_workers: int, key: str | None, preload_modules: Iterable[str] = ()
+    ) -> "ProcessPoolExecutor":
+        """
+        The executor for the workers, which are forked when it is first used. The
+        preload_modules are imported before that.
+        """
+        from loky import ProcessPoolExecutor  # type: ignore
+        from loky.backend import get_context  # type: ignore
+
+        if self.executor is not None and (self.max_workers, self.key) != (
+            max_workers,
+            key,
+        ):
+            logger.info("Worker pool: replacing the workers")
+            self.shutdown()
+        elif self.executor is not None and not self.is_usable():
+            logger.info("Worker pool: replacing the broken or shut down workers")
+            self.shutdown()
+        if self.executor is None:
+            # Imported here so that forked workers share them. The initializer only
+            # does something if the workers are not forked.
+            module_names = sorted(preload_modules)
+            import_modules(module_names)
+            self.executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                context=get_context("fork"),
+                initializer=import_modules,
+                initargs=(module_names, False),
+            )
+            self.max_workers = max_workers
+            self.key = key
+        return self.executor
+
+    def is_usable(self) -> bool:
+        # loky marks the executor as broken when e.g. a worker process has died
+        flags = getattr(self.executor, "_flags", None)
+        if flags is None:
+            return self.executor is not None
+        return flags.broken is None and not flags.shutdown
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+            self.key = None
+
+
+def import_modules(module_names: Iterable[str], warn: bool = True):
+    """
+    Import the modules to preload. Failures are only warned about in the parent
+    process, since every worker would otherwise repeat the warning.
+    """
+    for name in module_names:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            if warn:
+                output_warning(f"Could not preload module '{name}': {e}")
+
+
+def calculate_worker_key(scheduler: Scheduler) -> str:
+    """
+    Digest of the names, the commands, the inputs and outputs and the source files of
+    the actions that are run on the workers, and of the modules to preload. When it
+    changes, e.g. because a Byggfile has been edited, the workers have to be forked
+    again to get the new actions. The command digests cover the values that the
+    commands close over, like the shell strings of shell commands, which don't show up
+    in the source files. The inputs and outputs cover file lists that are e.g. globbed
+    when the Byggfile is evaluated.
+    """
+    action_digests: list[str] = []
+    source_files: set[str] = set()
+    for name, action in scheduler.build_actions.items():
+        if action.command is None or action.scheduling_type != "processpool":
+            continue
+        action_digests.append(
+            calculate_digest(
+                [
+                    f"name:{name}",
+                    f"command:{calculate_command_digest(action.command)}",
+                    *(f"input:{f}" for f in sorted(action.inputs)),
+                    *(f"output:{f}" for f in sorted(action.outputs)),
+                ]
+            )
+        )
+        code = getattr(action.command, "__code__", None) or getattr(
+            getattr(type(action.command), "__call__", None), "__code__", None
+        )
+        if code is not None:
+            source_files.add(code.co_filename)
+    return calculate_digest(
+        [
+            *sorted(action_digests),
+            *(f"{f}:{calculate_file_digest(f)}" for f in sorted(source_files)),
+            *(f"preload:{m}" for m in sorted(scheduler.preload_modules)),
+        ]
+    )
+
+
 class ProcessRunner:
     scheduler: Scheduler
     job_status_listener: JobStatusListener
     runner_status_listener: RunnerStatusListener
     failed_jobs: list[Job]
+    # Kept between runs if given, otherwise the workers only live for one run
+    worker_pool: WorkerPool | None
 
-    def __init__(self, scheduler: Scheduler):
+    def __init__(self, scheduler: Scheduler, worker_pool: WorkerPool | None = None):
         self.scheduler = scheduler
         self.job_status_listener = lambda *args: None
         self.runner_status_listener = lambda *args: None
         self.failed_jobs = []
-
-    def start(self, max_workers: int = 1) -> list[Job]:
-        from loky import Future, ProcessPoolExecutor, wait  # type: ignore
-        from loky.backend import get_context  # type: ignore
+        self.worker_pool = worker_pool
+
+    def start(
+        self,
+        max_workers: int = 1,
+        thread_workers: int | None = None,
+        async_workers: int | None = None,
+    ) -> list[Job]:
+        """
+        Run the jobs from the scheduler. Jobs are run on max_workers worker processes,
+        or on thread_workers threads for jobs with the "thread" scheduling type. Up to
+        async_workers jobs with the "async" scheduling type are run on an event loop in
+        addition to those. None means get_thread_job_count_limit() for thread_workers and
+        max_workers for async_workers, so that the job count limits shell commands from
+        Byggfile.toml too. Jobs with the "in-process" scheduling type are run on a
+        thread of their own.
+        """
+        from loky import Future  # type: ignore
 
         total_job_count = len(self.scheduler.job_graph)
+        if thread_workers is None:
+            thread_workers = get_thread_job_count_limit()
+        if async_workers is None:
+            async_workers = max_workers
 
         self.runner_status_listener(
             f"Starting process runner with {max_workers} threads"
         )
 
-        with ProcessPoolExecutor(
-            max_workers=max_workers,
-            context=get_context("fork"),
-        ) as pool:
-            scheduled_jobs: dict[Job, Future] = {}
-            backlog: list[Job] = []
-
-            # Jobs can be deferred because their channel is full. We then need the
-            # runner to iterate over running jobs before adding them back to the
-            # backlog.
-            deferred_backlog: list[Job] = []
-            # Keep active WorkChannel objects here since the objects don't survive the
-            # serialisation pass intact.
-            work_channels: dict[str, WorkChannel] = {}
-
-            def manage_work_channel_add(job: Job) -> bool:
-                if work_channel := job.action.work_channel:
-                    logger.debug(
-                        "Job %s is allocated to work channel %s",
-                        job.name,
-                        work_channel.name,
+        thread_pools: dict[str, ThreadPoolExecutor] = {}
+        thread_pool_sizes = {"thread": thread_workers, "in-process": IN_PROCESS_THREADS}
+        with (
+            contextlib.ExitStack() as exit_stack,
+            AsyncEngine() as async_engine,
+        ):
+            worker_pool = self.worker_pool or exit_stack.enter_context(WorkerPool())
+            pool = worker_pool.get(
+                max_workers,
+                calculate_worker_key(self.scheduler),
+                self.scheduler.preload_modules,
+            )
+            workers_started = False
+
+            def start_workers():
+                # Make the process pool fork its workers before there are other
+                # threads, since a fork only copies the thread that forks.
+                nonlocal workers_started
+                if not workers_started:
+                    pool.submit(int).result()
+                    workers_started = True
+
+            def get_thread_pool(scheduling_type: str) -> ThreadPoolExecutor:
+                if scheduling_type not in thread_pools:
+                    start_workers()
+                    thread_pools[scheduling_type] = exit_stack.enter_context(
+                        ThreadPoolExecutor(
+                            max_workers=thread_pool_sizes[scheduling_type],
+                            thread_name_prefix=f"bygg-{scheduling_type}",
+                        )
                     )
+                return thread_pools[scheduling_type]
 
-                    if work_channel.name not in work_channels:
-                        work_channels[work_channel.name] = work_channel
-
-                    if len(work_channel.current_jobs) >= work_channel.width:
-                        logger.debug(
-                            "Work channel %s is full. Contents: %s",
-                            work_channel.name,
-                            work_channel.current_jobs,
-                        )
-                        backlog.remove(job)
-                        deferred_backlog.append(job)
-                        return True
-                    else:
-                        logger.debug(
-                            "Work channel %s has room, adding job %s",
-                            work_channel.name,
-                            job.name,
+            def submit(job: Job) -> Future:
+                match job.action.scheduling_type:
+                    case "thread" | "in-process":
+                        return get_thread_pool(job.action.scheduling_type).submit(
+                            run_job, job.name, False
                         )
-                        work_channel.current_jobs.add(job.name)
-                return False
-
-            def manage_work_channel_remove(job: Job):
-                if job.action.work_channel:
-                    work_channel = work_channels.get(job.action.work_channel.name)
-                    if work_channel and job.name in work_channel.current_jobs:
-                        work_channel.current_jobs.remove(job.name)
+                    case "async":
+                        start_workers()
+                        return async_engine.submit(run_job_async(job.name))
+                    case _:
+                        # The workers are forked from this process and have the
+                        # actions already, so only the name is sent.
+                        return pool.submit(run_job, job.name)
+
+            # The jobs that run on the workers, by their futures
+            scheduled_jobs: dict[Future, Job] = {}
+            # The futures of the scheduled jobs are put here as they complete, and
+            # those of the scheduler's downloads from the remote cache
+            completed_futures: queue.SimpleQueue[Future] = queue.SimpleQueue()
+            self.scheduler.remote_fetch_listener = completed_futures.put
+            artifact_store = self.scheduler.artifact_store
+            if artifact_store and artifact_store.remote:
+                # The transfers to and from the remote cache run on threads
+                start_workers()
+            # Jobs from the scheduler that haven't been started yet
+            dispatch_queue = DispatchQueue()
+            # Jobs that have been taken from the dispatch queue but wait for room in
+            # their pool, by scheduling type
+            pending_jobs: dict[str, deque[Job]] = {}
+            # Keep the number of scheduled jobs for each pool relatively short; no need
+            # to schedule much more than there are workers
+            pool_limits = {
+                "processpool": max_workers * 2,
+                "thread": thread_workers * 2,
+                "in-process": IN_PROCESS_THREADS * 2,
+                "async": async_workers,
+            }
+            pool_job_counts = {scheduling_type: 0 for scheduling_type in pool_limits}
+
+            def has_room(scheduling_type: str) -> bool:
+                return (
+                    scheduling_type not in pool_limits
+                    or pool_job_counts[scheduling_type] < pool_limits[scheduling_type]
+                )
 
             def call_status_listener():
-                for job in scheduled_jobs.keys():
+                for job in scheduled_jobs.values():
                     self.job_status_listener(
                         "running",
                         job,
@@ -110,8 +398,24 @@ class ProcessRunner:
                 return (
                     len(self.scheduler.finished_jobs) + len(self.failed_jobs),
                     total_job_count,
+                    self.scheduler.estimate_remaining_time(max_workers),
                 )
 
+            def next_job() -> Job | None:
+                # Jobs that have waited for their pool go first
+                for scheduling_type, jobs in pending_jobs.items():
+                    if jobs and has_room(scheduling_type):
+                        return jobs.popleft()
+                while any(has_room(t) for t in pool_limits) and (
+                    job := dispatch_queue.pop()
+                ):
+                    if has_room(job.action.scheduling_type):
+                        return job
+                    pending_jobs.setdefault(job.action.scheduling_type, deque()).append(
+                        job
+                    )
+                return None
+
             # If a job fails, we want to stop scheduling new jobs and just wait for the
             # ones that are already running to finish.
             exit_reasons: list[Job] = []
@@ -119,88 +423,58 @@ class ProcessRunner:
             while True:
                 if (
                     not exit_reasons
-                    and len(backlog) < 2 * max_workers
+                    and len(dispatch_queue) < 2 * max_workers
                     and (jobs := self.scheduler.get_ready_jobs())
                 ):
-                    backlog += jobs
-
-                # Put deferred jobs back on the backlog
-                backlog += deferred_backlog
-                deferred_backlog = []
-
-                if (
-                    len(scheduled_jobs) == 0
-                    and len(backlog) == 0
-                    and (self.scheduler.run_status() == "finished" or exit_reasons)
-                ):
-                    return exit_reasons
-
-                # Keep the scheduled queue relatively short; no need to schedule much
-                # more than we have workers
-                batch_size = max_workers * 2
-                if len(scheduled_jobs) < batch_size:
-                    for job in backlog:
-                        # Skip jobs with no command or ones that are clean
+                    for job in jobs:
                         if job.action.command is None:
-                            job.status = CommandStatus(
-                                0,
-                                f"{'No command, skipping'}",
-                                None,
-                            )
+                            # Nothing to run, so the job is done already
+                            job.status = CommandStatus(0, "No command, skipping", None)
                             self.scheduler.job_finished(job)
                             self.job_status_listener(
                                 "skipped",
                                 job,
                                 get_job_count_tuple(),
                             )
-                            backlog.remove(job)
-                            continue
-
-                        if manage_work_channel_add(job):
-                            # Job got deferred; continue to the next job
-                            continue
-
-                        # Run in-process
-                        if job.action.scheduling_type == "in-process":
-                            self.job_status_listener(
-                                "running",
-                                job,
-                                get_job_count_tuple(),
-                            )
-                            job.status = job.action.command(job.action)
-
-                            manage_work_channel_remove(job)
-
-                            self.scheduler.job_finished(job)
-                            self.job_status_listener(
-                                "finished" if job.status.rc == 0 else "failed",
-                                job,
-                                get_job_count_tuple(),
+                        else:
+                            dispatch_queue.push(
+                                job, self.scheduler.priorities.get(job.name, 0.0)
                             )
-                            backlog.remove(job)
 
-                            continue
-
-                        # Schedule job to be run on the worker processes
-                        backlog.remove(job)
-                        scheduled_jobs[job] = pool.submit(run_job, (job))
+                if (
+                    len(scheduled_jobs) == 0
+                    and len(dispatch_queue) == 0
+                    and not any(pending_jobs.values())
+                    and (self.scheduler.run_status() == "finished" or exit_reasons)
+                ):
+                    return exit_reasons
 
-                call_status_listener()
+                while next_ready := next_job():
+                    # Schedule job to be run on a worker
+                    future = submit(next_ready)
+                    scheduled_jobs[future] = next_ready
+                    pool_job_counts[next_ready.action.scheduling_type] += 1
+                    self.job_status_listener(
+                        "running",
+                        next_ready,
+                        (len(self.scheduler.finished_jobs), total_job_count),
+                    )
+                    future.add_done_callback(completed_futures.put)
 
-                if len(scheduled_jobs) == 0:
+                if len(scheduled_jobs) == 0 and not self.scheduler.remote_fetches:
                     continue
 
-                completed_jobs, _ = wait(
-                    scheduled_jobs.values(), timeout=0.1, return_when="FIRST_COMPLETED"
-                )
-                for future in completed_jobs:
-                    job_result = future.result()
-                    assert isinstance(job_result, Job)
-                    del scheduled_jobs[job_result]
+                for future in wait_for_completed(completed_futures):
+                    if future not in scheduled_jobs:
+                        # A download, which is picked up by get_ready_jobs
+                        continue
+                    job_result = scheduled_jobs.pop(future)
+                    pool_job_counts[job_result.action.scheduling_type] -= 1
+                    future.result().apply(job_result)
 
                     self.check_for_missing_output_files(job_result)
 
-                    manage_work_channel_remove(job_result)
+                    dispatch_queue.release(job_result)
 
                     self.scheduler.job_finished(job_result)
                     if job_result.status is not None and job_result.status.rc == 0:
@@ -235,15 +509,154 @@ class ProcessRunner:
             )
 
 
-def run_job(job: Job):
+# ru_maxrss is in kilobytes on Linux but in bytes on macOS
+RU_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def wait_for_completed(completed_futures: queue.SimpleQueue) -> list:
+    """
+    Block until at least one future has completed, and return all that have completed.
+    """
+    while True:
+        try:
+            completed = [completed_futures.get(timeout=WAKEUP_INTERVAL)]
+            break
+        except queue.Empty:
+            continue
+    while not completed_futures.empty():
+        completed.append(completed_futures.get_nowait())
+    return completed
+
+
+def run_measured(
+    job: Job, command: Callable[[], CommandStatus], measure_resources: bool = True
+):
+    """
+    Run command and set the job's status and resource usage. CPU time includes child
+    processes that have been waited for. Peak RSS is only known for the job if the
+    high-water mark of the process or its children was raised while it ran, since there
+    is no portable way of resetting it. Otherwise it is None, so that a job that runs
+    after a larger one in the same worker doesn't get the larger one's peak.
+
+    The resource usage is per process, so pass measure_resources=False for jobs that
+    run in parallel with others in the same process. Only the duration is set then.
+    """
+    if not measure_resources:
+        start_time = time.perf_counter()
+        try:
+            job.status = command()
+        finally:
+            job.duration = time.perf_counter() - start_time
+        return
+
+    self_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start_time = time.perf_counter()
+    try:
+        job.status = command()
+    finally:
+        job.duration = time.perf_counter() - start_time
+        self_after = resource.getrusage(resource.RUSAGE_SELF)
+        children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        job.cpu_time = sum(
+            after.ru_utime + after.ru_stime - before.ru_utime - before.ru_stime
+            for before, after in (
+                (self_before, self_after),
+                (children_before, children_after),
+            )
+        )
+        raised_peaks = [
+            after.ru_maxrss
+            for before, after in (
+                (self_before, self_after),
+                (children_before, children_after),
+            )
+            if after.ru_maxrss > before.ru_maxrss
+        ]
+        job.peak_rss = max(raised_peaks) * RU_MAXRSS_UNIT if raised_peaks else None
+
+
+@dataclass
+class JobResult:
+    """What a worker sends back after running a job."""
+
+    status: CommandStatus
+    duration: float | None
+    cpu_time: float | None
+    peak_rss: int | None
+
+    def apply(self, job: Job):
+        job.status = self.status
+        job.duration = self.duration
+        job.cpu_time = self.cpu_time
+        job.peak_rss = self.peak_rss
+
+
+def call_command(command: Command, ctx: ActionContext) -> CommandStatus:
+    """Call a command, running it on an event loop of its own if it's async."""
+    result = command(ctx)
+    if inspect.isawaitable(result):
+        return asyncio.run(awaitable_to_coroutine(result))
+    return result
+
+
+async def awaitable_to_coroutine(awaitable: Awaitable[T]) -> T:
+    return await awaitable
+
+
+def run_job(job_name: str, measure_resources: bool = True) -> JobResult:
+    """
+    Run a job on a worker process or thread. A worker process is forked from the main
+    process after the actions have been loaded, so the action is looked up by its name.
+    """
+    action = Action.scheduler.build_actions.get(job_name) if Action.scheduler else None
+    if action is None:
+        return JobResult(
+            CommandStatus(1, f"Action '{job_name}' not found in worker.", None),
+            None,
+            None,
+            None,
+        )
+    job = Job(action)
     try:
-        if job.action.command is None:
+        if action.command is None:
             job.status = CommandStatus(0, "No command, skipping", None)
         else:
-            job.status = job.action.command(job.action)
+            command = action.command
+            run_measured(job, lambda: call_command(command, action), measure_resources)
     except Exception as e:
         job.status = CommandStatus(1, "Job failed with exception.", f"{e}")
-    return job
+    assert job.status is not None
+    return JobResult(job.status, job.duration, job.cpu_time, job.peak_rss)
+
+
+async def run_job_async(job_name: str) -> JobResult:
+    """
+    Run a job on the runner's event loop. Async functions are awaited and shell commands
+    are run as asyncio subprocesses; other commands are run on a thread.
+    """
+    action = Action.scheduler.build_actions.get(job_name) if Action.scheduler else None
+    if action is None or action.command is None:
+        return JobResult(
+            CommandStatus(1, f"Action '{job_name}' not found.", None), None, None, None
+        )
+    command = action.command
+    start_time = time.perf_counter()
+    try:
+        if isinstance(command, ShellCommand):
+            status = await command.run_async(action)
+        elif inspect.iscoroutinefunction(command):
+            status = await command(action)
+        else:
+            status = await asyncio.to_thread(call_command, command, action)
+    except Exception as e:
+        status = CommandStatus(1, "Job failed with exception.", f"{e}")
+    return JobResult(status, time.perf_counter() - start_time, None, None)
+
+
+def get_thread_job_count_limit():
+    """Default number of threads for jobs with the "thread" scheduling type."""
+    return min(4 * get_job_count_limit(), 64)
 
 
 def get_job_count_limit():
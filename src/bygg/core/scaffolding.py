@@ -2,10 +2,41 @@
 Functions for setting up the file structure.
 """
 
+from collections.abc import Iterator
+import contextlib
+import fcntl
+import os
 from pathlib import Path
+import pickle
+from typing import Any
 
 STATUS_DIR = Path(".bygg")
 
 
 def make_sure_status_dir_exists():
     STATUS_DIR.mkdir(parents=True, exist_ok=True)
+
+
+@contextlib.contextmanager
+def locked_status_file(file: Path) -> Iterator[None]:
+    """
+    Hold an exclusive lock for updating the file, so that bygg processes that run in
+    the same tree at the same time don't overwrite each other's changes. The lock is
+    taken on a separate lock file next to the file.
+    """
+    file.parent.mkdir(parents=True, exist_ok=True)
+    with open(file.with_name(f"{file.name}.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_pickle_atomically(file: Path, data: Any):
+    """Write the pickled data to a temporary file and rename it to the file, so that
+    readers never see a partially written file."""
+    tmp_file = file.with_name(f"{file.name}.{os.getpid()}.tmp")
+    with open(tmp_file, "wb") as f:
+        pickle.dump(data, f)
+    os.replace(tmp_file, file)
@@ -1,52 +1,135 @@
+from collections import deque
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future
+import heapq
+import itertools
+import os
 from pathlib import Path
 from typing import Literal
 
 from bygg.core.action import Action
+from bygg.core.artifact_store import DEFAULT_ARTIFACT_STORE_DIR, ArtifactStore
 from bygg.core.cache import Cache
 from bygg.core.dag import Dag, create_dag
-from bygg.core.digest import calculate_dependency_digest, calculate_digest
+from bygg.core.digest import (
+    DEFAULT_DIGEST_JOBS,
+    DigestContext,
+    calculate_command_digest,
+    calculate_digest,
+    file_digest_cache,
+    prefetch_file_digests,
+)
 from bygg.core.job import Job
+from bygg.core.remote_cache import RemoteArtifactCache
+from bygg.core.timings import Timings
 from bygg.logutils import logger
 from bygg.output.status_display import on_check_failed
 
+# Weight used for the critical path calculation for actions that have not been timed yet
+DEFAULT_JOB_DURATION = 1.0
+
 
 class Scheduler:
     cache: Cache
+    timings: Timings
+    # Digests calculated during the current run
+    digests: DigestContext
     build_actions: dict[str, Action]
+    # Modules to import before the worker processes are started, see preload_modules
+    preload_modules: set[str]
+    # Stores and restores the outputs of jobs, if enabled for the run
+    artifact_store: ArtifactStore | None
+    artifact_store_dir: Path
 
     job_graph: Dag
+    # The jobs in the graph, dependencies before the jobs that depend on them
+    job_order: list[str]
+    # The jobs that read each file, as an input or as an output from a dependency. The
+    # keys are absolute paths.
+    file_consumers: dict[str, set[str]]
+    # If set, only these jobs are built, and the other jobs are assumed to be up to date
+    affected_jobs: set[str] | None
+    # Length of the longest path of estimated job durations from each job to the end of
+    # the build, including the job itself
+    priorities: dict[str, float]
+    # Expected duration of each job and the sum for the jobs that haven't finished
+    estimated_durations: dict[str, float]
+    remaining_work: float
+    has_duration_estimates: bool
     ready_jobs: set[str]
+    # Heap with the ready jobs, the one with the highest priority first
+    ready_queue: list[tuple[float, int, str]]
     running_jobs: dict[str, Job]
     finished_jobs: dict[str, Job]
+    # Downloads from the remote cache for the jobs that wait for them, by job name
+    remote_fetches: dict[str, Future[bool]]
+    # Called with each download from the remote cache when it has completed
+    remote_fetch_listener: Callable[[Future[bool]], None]
 
     started: bool
     always_make: bool
+    critical_path: bool
+    # Number of threads for calculating the file digests of the ready jobs
+    digest_jobs: int
     check_inputs_outputs_set: set[str] | None
 
     def __init__(self):
         Action.scheduler = self
         self.cache = Cache()
+        self.timings = Timings()
+        self.digests = DigestContext()
         self.build_actions = {}
+        self.preload_modules = set()
+        self.artifact_store = None
+        self.artifact_store_dir = DEFAULT_ARTIFACT_STORE_DIR
         self.job_graph = create_dag()
+        self.job_order = []
+        self.file_consumers = {}
+        self.affected_jobs = None
+        self.priorities = {}
+        self.estimated_durations = {}
+        self.remaining_work = 0.0
+        self.has_duration_estimates = False
         self.ready_jobs = set()
+        self.ready_queue = []
+        self.ready_queue_counter = itertools.count()
         self.running_jobs = {}
         self.finished_jobs = {}
+        self.remote_fetches = {}
+        self.remote_fetch_listener = lambda future: None
         self.started = False
         self.always_make = False
+        self.critical_path = True
+        self.digest_jobs = DEFAULT_DIGEST_JOBS
         self.check_inputs_outputs_set = None
 
     def init_cache(self, cache_file: Path):
         self.cache = Cache(cache_file)
+        self.timings = Timings(cache_file.with_suffix(".timings"))
+        file_digest_cache.use_file(cache_file.with_suffix(".digests"))
+        self.artifact_store_dir = cache_file.with_suffix(".cas")
 
-    def prepare_run(self, entrypoint: str, check=False):
+    def prepare_run(self, entrypoints: str | list[str], check=False):
         self.job_graph.clear()
+        self.digests.clear()
+        self.job_order = []
+        self.file_consumers = {}
+        self.affected_jobs = None
+        self.priorities = {}
         self.ready_jobs = set()
+        self.ready_queue = []
         self.running_jobs = {}
         self.finished_jobs = {}
-
-        self.job_graph.build_action_graph(
-            self.build_actions, self.build_actions[entrypoint]
-        )
+        self.remote_fetches = {}
+
+        if isinstance(entrypoints, str):
+            entrypoints = [entrypoints]
+        # Shared dependencies are only added once to the graph
+        for entrypoint in entrypoints:
+            self.job_graph.build_action_graph(
+                self.build_actions, self.build_actions[entrypoint]
+            )
+        self.job_order = self.job_graph.get_topological_order()
 
         if check:
             # Do this check before dependency files are filled in from dependencies
@@ -65,25 +148,134 @@ class Scheduler:
                 )
 
         # Fill the actions' dependency_files from self and their dependencies
-        for action in self.build_actions.values():
+        for job_name in self.job_order:
+            action = self.build_actions[job_name]
             action.dependency_files.update(action.inputs)
             for dependency in action.dependencies:
                 action.dependency_files.update(self.build_actions[dependency].outputs)
             # print(f"Action {action.name} inputs: {action._dependency_files}")
+            for file in action.dependency_files:
+                self.file_consumers.setdefault(os.path.abspath(file), set()).add(
+                    job_name
+                )
 
     def start_run(
-        self, entrypoint: str, *, always_make: bool = False, check: bool = False
+        self,
+        entrypoints: str | list[str],
+        *,
+        always_make: bool = False,
+        check: bool = False,
+        critical_path: bool = True,
+        changed_files: list[str] | None = None,
+        digest_jobs: int | None = None,
+        artifact_cache: bool = False,
+        remote_cache: str | None = None,
     ):
         self.always_make = always_make
+        self.critical_path = critical_path
+        self.digest_jobs = DEFAULT_DIGEST_JOBS if digest_jobs is None else digest_jobs
         self.check_inputs_outputs_set = set() if check else None
-        self.prepare_run(entrypoint, check)
+        self.artifact_store = (
+            ArtifactStore(
+                self.artifact_store_dir,
+                remote=RemoteArtifactCache(remote_cache) if remote_cache else None,
+            )
+            if artifact_cache or remote_cache
+            else None
+        )
+        self.prepare_run(entrypoints, check)
+        if changed_files is not None:
+            self.affected_jobs = self.find_affected_jobs(changed_files)
         self.cache.load()
+        self.timings.load()
+        self.estimate_durations()
+        if self.critical_path:
+            self.calculate_priorities()
         self.started = True
 
+    def estimate_durations(self):
+        """
+        Estimate the duration of each job from earlier runs. Jobs without a recorded
+        duration get the average of the known ones.
+        """
+        known_durations = {
+            job_name: d
+            for job_name in self.job_order
+            if (d := self.timings.get_duration(job_name)) is not None
+        }
+        self.has_duration_estimates = len(known_durations) > 0
+        default_duration = (
+            sum(known_durations.values()) / len(known_durations)
+            if known_durations
+            else DEFAULT_JOB_DURATION
+        )
+        self.estimated_durations = {
+            job_name: known_durations.get(job_name, default_duration)
+            for job_name in self.job_order
+        }
+        self.remaining_work = sum(self.estimated_durations.values())
+
+    def calculate_priorities(self):
+        """
+        Calculate the priority of each job as the longest path of estimated durations
+        from the job to the end of the build. Jobs on the critical path are then started
+        first.
+        """
+        dependents = self.create_dependents_dict()
+        self.priorities = {}
+        # Dependents come before their dependencies in the reversed order
+        for job_name in reversed(self.job_order):
+            self.priorities[job_name] = self.estimated_durations[job_name] + max(
+                (self.priorities[d] for d in dependents[job_name]), default=0.0
+            )
+
+    def create_dependents_dict(self) -> dict[str, list[str]]:
+        """Create a dictionary of jobs to the jobs that depend on them"""
+        dependents: dict[str, list[str]] = {job_name: [] for job_name in self.job_order}
+        for job_name in self.job_order:
+            for dependency in self.build_actions[job_name].dependencies:
+                dependents[dependency].append(job_name)
+        return dependents
+
+    def find_affected_jobs(self, changed_files: Iterable[str]) -> set[str]:
+        """
+        Find the jobs that read any of the changed files, and all jobs that depend on
+        them, directly or indirectly.
+        """
+        dependents = self.create_dependents_dict()
+        queue = deque(
+            job_name
+            for file in changed_files
+            for job_name in self.file_consumers.get(os.path.abspath(file), ())
+        )
+        affected: set[str] = set()
+        while queue:
+            job_name = queue.popleft()
+            if job_name in affected:
+                continue
+            affected.add(job_name)
+            queue.extend(dependents[job_name])
+        return affected
+
+    def estimate_remaining_time(self, workers: int) -> float | None:
+        """
+        Estimate the remaining time of the run in seconds, or None if there are no
+        recorded durations to base the estimate on. The estimate is the remaining work
+        spread over the workers, but never less than the longest remaining path among
+        the running jobs.
+        """
+        if not self.has_duration_estimates:
+            return None
+        longest_path = max(
+            (self.priorities.get(job_name, 0.0) for job_name in self.running_jobs),
+            default=0.0,
+        )
+        return max(self.remaining_work / max(workers, 1), longest_path)
+
     def create_outputs_to_action_dict(self):
         """Create a dictionary of outputs to actions"""
         res: dict[str, set[str]] = {}
-        for job in self.job_graph.get_all_jobs():
+        for job in self.job_order:
             action = self.build_actions[job]
             for output in action.outputs:
                 if output not in res:
@@ -93,6 +285,11 @@ class Scheduler:
 
     def shutdown(self):
         self.cache.save()
+        file_digest_cache.save()
+        if self.artifact_store:
+            self.artifact_store.save()
+        if self.started:
+            self.timings.save()
 
     def run_status(self) -> Literal["not started", "running", "finished", "failed"]:
         """Check the status of the run"""
@@ -139,7 +336,9 @@ class Scheduler:
             logger.debug("Job '%s' is dirty (no previous result)", job_name)
             return True
 
-        outputs_digest, files_were_missing = calculate_dependency_digest(action.outputs)
+        outputs_digest, files_were_missing = self.digests.dependency_digest(
+            action.outputs
+        )
         if files_were_missing or cached_digests.outputs_digest != outputs_digest:
             # The output has changed, so we need to rebuild
             if files_were_missing:
@@ -148,7 +347,7 @@ class Scheduler:
                 logger.debug("Job '%s' is dirty (output digest changed)", job_name)
             return True
 
-        inputs_digest, files_were_missing = calculate_dependency_digest(
+        inputs_digest, files_were_missing = self.digests.dependency_digest(
             action.dependency_files
         )
 
@@ -157,10 +356,10 @@ class Scheduler:
             if not cached_digests.dynamic_digest:
                 return True
 
-            dd_result = action.dynamic_dependency()
+            dynamic_digest = self.get_dynamic_digest(action)
             if (
-                dd_result is None
-                or calculate_digest([dd_result]) != cached_digests.dynamic_digest
+                dynamic_digest is None
+                or dynamic_digest != cached_digests.dynamic_digest
             ):
                 logger.debug("Job '%s' is dirty (dynamic dependency changed)", job_name)
                 return True
@@ -174,26 +373,53 @@ class Scheduler:
         logger.debug("Job '%s' is clean", job_name)
         return False
 
+    def get_dynamic_digest(self, action: Action) -> str | None:
+        """
+        The digest of the result from the action's dynamic dependency. The dynamic
+        dependency is only called once per run for each action.
+        """
+        if action.name not in self.digests.dynamic_digests:
+            result = action.dynamic_dependency() if action.dynamic_dependency else None
+            self.digests.dynamic_digests[action.name] = (
+                calculate_digest([result]) if result else None
+            )
+        return self.digests.dynamic_digests[action.name]
+
     def get_ready_jobs(self, batch_size: int = 0) -> list[Job]:
         """
         Create a batch of jobs and put them in the running pool. Returns all ready jobs
         if batch_size is 0.
 
         An empty job list may be returned even if there are more jobs left to run if all
-        jobs in the batch were skipped. Job runners should continue polling for more
-        jobs until the scheduler status is "finished".
+        jobs in the batch were skipped, or if they wait for downloads from the remote
+        cache. Job runners should continue polling for more jobs until the scheduler
+        status is "finished".
         """
+        self.collect_remote_fetches()
         if batch_size == 0 or len(self.ready_jobs) < batch_size:
             new_jobs = self.job_graph.get_ready_jobs(
                 self.finished_jobs, self.running_jobs
             )
-            dirty_jobs = []
+            self.prefetch_digests(
+                [
+                    job
+                    for job in new_jobs
+                    if self.affected_jobs is None or job in self.affected_jobs
+                ]
+            )
             for job in new_jobs:
-                if self.check_dirty(job):
-                    dirty_jobs.append(job)
-                else:
+                if self.affected_jobs is not None and job not in self.affected_jobs:
+                    # Not reachable from the changed files, so don't check it
+                    self.skip_job(job)
+                elif not self.check_dirty(job):
                     self.skip_job(job)
-            self.ready_jobs.update(dirty_jobs)
+                elif self.fetch_artifacts(job):
+                    # Made ready or skipped when the download has completed
+                    continue
+                elif self.restore_artifacts(job):
+                    self.skip_job(job)
+                else:
+                    self.add_ready_job(job)
 
         if len(self.ready_jobs) == 0:
             return []
@@ -204,7 +430,7 @@ class Scheduler:
             if batch_size == 0
             else min(batch_size, len(self.ready_jobs))
         ):
-            action = self.build_actions[self.ready_jobs.pop()]
+            action = self.build_actions[self.pop_ready_job()]
             new_job = Job(action)
             self.running_jobs[new_job.name] = new_job
             job_list.append(new_job)
@@ -229,28 +455,74 @@ class Scheduler:
 
         return job_list
 
+    def prefetch_digests(self, job_names: list[str]):
+        """
+        Calculate the digests of the files that check_dirty and store_input_digests
+        will need for the jobs concurrently. Files that are shared between the jobs are
+        only hashed once.
+        """
+        if self.always_make or self.digest_jobs <= 1 or len(job_names) == 0:
+            return
+        files: set[str] = set()
+        for job_name in job_names:
+            action = self.build_actions[job_name]
+            files.update(action.dependency_files)
+            # The outputs are only checked if there is a previous result
+            if self.cache.get_digests(job_name):
+                files.update(action.outputs)
+        files -= self.digests.file_digests.keys()
+        if len(files) > 1:
+            self.digests.file_digests.update(
+                prefetch_file_digests(files, self.digest_jobs)
+            )
+
+    def add_ready_job(self, job_name: str):
+        if job_name in self.ready_jobs:
+            return
+        self.ready_jobs.add(job_name)
+        heapq.heappush(
+            self.ready_queue,
+            (
+                -self.priorities.get(job_name, 0.0),
+                next(self.ready_queue_counter),
+                job_name,
+            ),
+        )
+
+    def pop_ready_job(self) -> str:
+        """Pop the ready job with the highest priority."""
+        _, _, job_name = heapq.heappop(self.ready_queue)
+        self.ready_jobs.remove(job_name)
+        return job_name
+
     def skip_job(self, job_name: str):
         """Skip a job, remove it from the graph and don't send it to the runner."""
         self.job_graph.remove_node(job_name)
+        self.remaining_work -= self.estimated_durations.get(job_name, 0.0)
 
     def job_finished(self, job: Job):
         """Move a job from the running pool to the finished pool"""
         self.running_jobs.pop(job.name)
         self.finished_jobs[job.name] = job
+        # The job has written its outputs, also if it failed
+        self.digests.invalidate(job.action.outputs)
+        self.remaining_work -= self.estimated_durations.get(job.name, 0.0)
 
         if job.status and job.status.rc == 0:
             self.job_graph.remove_node(job.name)
             self.store_output_digest(job)
+            self.store_artifacts(job)
+            if job.duration is not None:
+                self.timings.add_timing(
+                    job.name, job.duration, job.cpu_time, job.peak_rss
+                )
         else:
             self.cache.remove_digests(job.name)
+        self.cache.commit_if_due()
 
     def store_input_digests(self, job: Job):
-        inputs_digest, _ = calculate_dependency_digest(job.action.dependency_files)
-        dynamic_digest = (
-            calculate_digest([dd])
-            if job.action.dynamic_dependency and (dd := job.action.dynamic_dependency())
-            else None
-        )
+        inputs_digest, _ = self.digests.dependency_digest(job.action.dependency_files)
+        dynamic_digest = self.get_dynamic_digest(job.action)
         self.cache.set_digests(job.name, inputs_digest, "", dynamic_digest)
 
     def store_output_digest(self, job: Job):
@@ -259,10 +531,88 @@ class Scheduler:
             "At this point, the digest should already be in the cache since the job was started, or it's a bug"
         )
 
-        outputs_digest, _ = calculate_dependency_digest(job.action.outputs)
+        outputs_digest, _ = self.digests.dependency_digest(job.action.outputs)
         self.cache.set_digests(
             job.name,
             stored_digest.inputs_digest,
             outputs_digest,
             stored_digest.dynamic_digest,
         )
+
+    def artifact_key(self, action: Action) -> str | None:
+        """
+        The key under which the action's outputs are stored in the artifact store, from
+        everything that determines the outputs. Returns None for actions whose outputs
+        should not be stored.
+        """
+        if not action.outputs or action.command is None:
+            return None
+        inputs_digest, files_were_missing = self.digests.dependency_digest(
+            action.dependency_files
+        )
+        if files_were_missing:
+            return None
+        return calculate_digest(
+            [
+                f"name:{action.name}",
+                f"inputs:{inputs_digest}",
+                f"dynamic:{self.get_dynamic_digest(action)}",
+                f"command:{calculate_command_digest(action.command)}",
+            ]
+        )
+
+    def restore_artifacts(self, job_name: str) -> bool:
+        """
+        Restore the outputs of a dirty job from the artifact store. Returns True if
+        they were restored, in which case the job doesn't need to run.
+        """
+        if self.artifact_store is None or self.always_make:
+            return False
+        action = self.build_actions[job_name]
+        key = self.artifact_key(action)
+        if key is None or not self.artifact_store.restore(key, action.outputs):
+            return False
+        logger.info("Job '%s': outputs restored from the artifact store", job_name)
+        self.digests.invalidate(action.outputs)
+        inputs_digest, _ = self.digests.dependency_digest(action.dependency_files)
+        outputs_digest, _ = self.digests.dependency_digest(action.outputs)
+        self.cache.set_digests(
+            job_name, inputs_digest, outputs_digest, self.get_dynamic_digest(action)
+        )
+        return True
+
+    def fetch_artifacts(self, job_name: str) -> bool:
+        """
+        Start downloading the outputs of a dirty job from the remote cache, if they're
+        not in the local artifact store. Returns True if the download was started. The
+        job then waits in remote_fetches, so that a slow remote cache doesn't hold up
+        the other jobs.
+        """
+        if self.artifact_store is None or self.always_make:
+            return False
+        key = self.artifact_key(self.build_actions[job_name])
+        if key is None or not self.artifact_store.can_fetch(key):
+            return False
+        future = self.artifact_store.fetch_in_background(key)
+        self.remote_fetches[job_name] = future
+        future.add_done_callback(self.remote_fetch_listener)
+        return True
+
+    def collect_remote_fetches(self):
+        """
+        Restore the outputs of the jobs whose downloads have completed, or make them
+        ready if they couldn't be downloaded.
+        """
+        for job_name in [j for j, f in self.remote_fetches.items() if f.done()]:
+            del self.remote_fetches[job_name]
+            if self.restore_artifacts(job_name):
+                self.skip_job(job_name)
+            else:
+                self.add_ready_job(job_name)
+
+    def store_artifacts(self, job: Job):
+        if self.artifact_store is None:
+            return
+        key = self.artifact_key(job.action)
+        if key is not None:
+            self.artifact_store.store(key, job.action.outputs)
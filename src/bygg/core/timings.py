@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+from pathlib import Path
+import pickle
+import statistics
+import time
+
+from bygg.core.scaffolding import (
+    STATUS_DIR,
+    locked_status_file,
+    make_sure_status_dir_exists,
+    write_pickle_atomically,
+)
+
+DEFAULT_TIMINGS_FILE = STATUS_DIR / "timings.db"
+
+# Number of runs to keep in the history for each action
+HISTORY_LENGTH = 20
+
+
+@dataclass
+class JobTiming:
+    """Resource usage from one successful run of an action."""
+
+    timestamp: float  # time.time() when the job finished
+    wall_time: float  # seconds
+    cpu_time: float | None = None  # user + system seconds, including child processes
+    # bytes, for the worker and its child processes; None if the job didn't raise the
+    # high-water mark of the worker
+    peak_rss: int | None = None
+
+
+@dataclass
+class TimingsState:
+    # The latest runs of each action, oldest first
+    history: dict[str, list[JobTiming]]
+
+
+class Timings:
+    """Keeps a rolling history of how long actions took to run in earlier builds."""
+
+    data: TimingsState
+    timings_file: Path
+    # Timings that were added since the last save
+    added: dict[str, list[JobTiming]]
+
+    def __init__(self, timings_file: Path = DEFAULT_TIMINGS_FILE):
+        self.data = TimingsState({})
+        self.timings_file = timings_file
+        self.added = {}
+
+    @classmethod
+    def reset(cls):
+        DEFAULT_TIMINGS_FILE.unlink(missing_ok=True)
+
+    def load(self):
+        make_sure_status_dir_exists()
+        self.data = self.read_file()
+
+    def read_file(self) -> TimingsState:
+        try:
+            with open(self.timings_file, "rb") as f:
+                data = pickle.load(f)
+        except (EOFError, FileNotFoundError, pickle.UnpicklingError, AttributeError):
+            return TimingsState({})
+        if not isinstance(data, TimingsState) or not isinstance(
+            getattr(data, "history", None), dict
+        ):
+            # Written by an earlier version of bygg, which only kept the latest duration
+            # of each action
+            return TimingsState({})
+        return data
+
+    def save(self):
+        """
+        Add the timings from this run to the timings file, which may have been updated
+        by other bygg processes in the meantime.
+        """
+        if not self.added:
+            return
+        with locked_status_file(self.timings_file):
+            data = self.read_file()
+            for name, timings in self.added.items():
+                history = data.history.setdefault(name, [])
+                history.extend(timings)
+                history.sort(key=lambda t: t.timestamp)
+                del history[:-HISTORY_LENGTH]
+            write_pickle_atomically(self.timings_file, data)
+        self.data = data
+        self.added = {}
+
+    def get_history(self, name: str) -> list[JobTiming]:
+        return self.data.history.get(name, [])
+
+    def get_duration(self, name: str) -> float | None:
+        """The expected wall time for the action, from the median of its history."""
+        history = self.data.history.get(name)
+        if not history:
+            return None
+        return statistics.median(t.wall_time for t in history)
+
+    def add_timing(
+        self,
+        name: str,
+        wall_time: float,
+        cpu_time: float | None = None,
+        peak_rss: int | None = None,
+    ):
+        timing = JobTiming(time.time(), wall_time, cpu_time, peak_rss)
+        self.added.setdefault(name, []).append(timing)
+        history = self.data.history.setdefault(name, [])
+        history.append(timing)
+        del history[:-HISTORY_LENGTH]
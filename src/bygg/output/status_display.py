@@ -56,8 +56,20 @@ def format_result_status(status: JobStatus, field_width: int) -> str:
 max_name_length = 0
 
 
+def format_duration(seconds: float) -> str:
+    """Format a duration as e.g. 45s, 3m05s or 1h02m."""
+    seconds = round(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m{seconds:02}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02}m"
+
+
 def get_on_job_status(args: ByggNamespace, configuration: Byggfile):
-    def on_job_status(job_status: JobStatus, job: Job, jobs_count: tuple[int, int]):
+    def on_job_status(job_status: JobStatus, job: Job, jobs_count: tuple):
         match job_status:
             case "skipped":
                 pass
@@ -69,7 +81,7 @@ def get_on_job_status(args: ByggNamespace, configuration: Byggfile):
             case _:
                 raise ValueError(f"Unhandled job status {job_status}")
 
-    def print_job_ended(job_status: JobStatus, job: Job, jobs_count: tuple[int, int]):
+    def print_job_ended(job_status: JobStatus, job: Job, jobs_count: tuple):
         global max_name_length
         max_name_length = max(len(job.name), max_name_length)
         status_code_message = f"[{job.status.rc}] " if job.status else "?"
@@ -78,6 +90,9 @@ def get_on_job_status(args: ByggNamespace, configuration: Byggfile):
 
         total_job_count_length = len(str(jobs_count[1]))
         job_count_info = f" ({jobs_count[0]:>{total_job_count_length}}/{jobs_count[1]})"
+        # The third element is the estimated remaining time, if there is one
+        if len(jobs_count) > 2 and jobs_count[2] is not None:
+            job_count_info += f" ETA {format_duration(jobs_count[2])}"
 
         if args.verbose or configuration.settings.verbose:
             result_status = format_result_status(job_status, 0)
@@ -1,25 +1,165 @@
+import asyncio
 from dataclasses import dataclass
 import os
+from pathlib import Path
 import re
+import signal
 import subprocess
 from typing import Optional
 
+from bygg.core.action import ActionContext
 from bygg.core.common_types import CommandStatus
+from bygg.core.digest import calculate_string_digest
+from bygg.core.scaffolding import STATUS_DIR
 
+# The output of each shell command is written to a file here
+JOB_LOG_DIR = STATUS_DIR / "logs"
 
-def create_shell_command(shell_command: str, message: Optional[str] = None):
-    def call_shell_command(inputs: Optional[set[str]], outputs: Optional[set[str]]):
-        # Map stderr onto stdout and return both as the output
-        process = subprocess.run(
-            shell_command,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            encoding="utf-8",
+# Bytes from the end of the output of a shell command that are kept in its status
+DEFAULT_OUTPUT_TAIL_SIZE = 64 * 1024
+
+
+# Return code for shell commands that time out, the same as from timeout(1)
+SHELL_COMMAND_TIMEOUT_RC = 124
+
+
+class ShellCommand:
+    """
+    Command that runs a shell command, with stderr mapped onto stdout. It can be called
+    like other commands, and the runner can also run it on its event loop with
+    run_async, which doesn't need a worker while the command runs.
+
+    The output is written to a log file for the action in JOB_LOG_DIR, and only the last
+    output_tail_size bytes of it are returned in the status. The size of the output
+    thus doesn't affect the memory use of the build.
+
+    If timeout is given, the command and its child processes are killed after that many
+    seconds.
+    """
+
+    shell_command: str
+    message: str | None
+    timeout: float | None
+    output_tail_size: int
+
+    def __init__(
+        self,
+        shell_command: str,
+        message: str | None = None,
+        timeout: float | None = None,
+        output_tail_size: int = DEFAULT_OUTPUT_TAIL_SIZE,
+    ):
+        self.shell_command = shell_command
+        self.message = message
+        self.timeout = timeout
+        self.output_tail_size = output_tail_size
+        # Used as the description of actions that don't have one
+        self.__doc__ = f"`{shell_command}`"
+
+    def __call__(self, ctx: ActionContext) -> CommandStatus:
+        log_file = create_job_log_file(ctx.name)
+        with open(log_file, "wb") as f:
+            process = subprocess.Popen(
+                self.shell_command,
+                shell=True,
+                stdout=f,
+                stderr=subprocess.STDOUT,
+                # Only needed for killing it on timeout; otherwise leave it in our
+                # process group so that it gets interrupts from the terminal
+                start_new_session=self.timeout is not None,
+            )
+        with process:
+            try:
+                process.wait(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                kill_process_group(process.pid)
+                process.wait()
+                return self.timed_out(log_file)
+        return self.finished(process.returncode, log_file)
+
+    async def run_async(self, ctx: ActionContext) -> CommandStatus:
+        """
+        Run the command as an asyncio subprocess. If the coroutine is cancelled, the
+        command and its child processes are killed.
+        """
+        log_file = create_job_log_file(ctx.name)
+        with open(log_file, "wb") as f:
+            process = await asyncio.create_subprocess_shell(
+                self.shell_command,
+                stdout=f,
+                stderr=asyncio.subprocess.STDOUT,
+                # In a process group of its own, so that its children can be killed too
+                start_new_session=True,
+            )
+        try:
+            await asyncio.wait_for(process.wait(), self.timeout)
+        except TimeoutError:
+            kill_process_group(process.pid)
+            await process.wait()
+            return self.timed_out(log_file)
+        except asyncio.CancelledError:
+            kill_process_group(process.pid)
+            raise
+        assert process.returncode is not None
+        return self.finished(process.returncode, log_file)
+
+    def finished(self, rc: int, log_file: Path) -> CommandStatus:
+        return CommandStatus(
+            rc,
+            self.message,
+            read_output_tail(log_file, self.output_tail_size),
+            log_file=str(log_file),
         )
-        return CommandStatus(process.returncode, message, process.stdout)
 
-    return lambda ctx: call_shell_command(ctx.inputs, ctx.outputs)
+    def timed_out(self, log_file: Path) -> CommandStatus:
+        status = self.finished(SHELL_COMMAND_TIMEOUT_RC, log_file)
+        status.message = f"Timed out after {self.timeout} s"
+        return status
+
+
+def create_job_log_file(action_name: str) -> Path:
+    """
+    The log file for the output of an action. Action names can be e.g. file paths, so
+    the file is named by a cleaned-up version of the name and a digest of it.
+    """
+    JOB_LOG_DIR.mkdir(parents=True, exist_ok=True)
+    name = re.sub(r"[^\w.-]+", "_", action_name)[:100]
+    return JOB_LOG_DIR / f"{name}-{calculate_string_digest(action_name)[:12]}.log"
+
+
+def read_output_tail(log_file: Path, size: int) -> str:
+    """
+    Read the last size bytes of a log file. If there is more, the output starts at the
+    next line, after a note about where the rest can be found.
+    """
+    with open(log_file, "rb") as f:
+        total_size = f.seek(0, os.SEEK_END)
+        f.seek(max(total_size - size, 0))
+        tail = f.read()
+    if total_size <= size:
+        return tail.decode("utf-8", "replace")
+    # Start at a line, unless the tail is a single line
+    tail = tail[tail.find(b"\n") + 1 :] if b"\n" in tail[:-1] else tail
+    return (
+        f"[{total_size - len(tail)} bytes of output omitted, see {log_file}]\n"
+        + tail.decode("utf-8", "replace")
+    )
+
+
+def kill_process_group(pid: int):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def create_shell_command(
+    shell_command: str,
+    message: Optional[str] = None,
+    timeout: float | None = None,
+    output_tail_size: int = DEFAULT_OUTPUT_TAIL_SIZE,
+) -> ShellCommand:
+    return ShellCommand(shell_command, message, timeout, output_tail_size)
 
 
 @dataclass
@@ -13,6 +13,7 @@ args = [
     (["-B"], ["--always-make"]),
     (["--always-make"], ["--always-make"]),
     (["-C", "foo/bar"], ["--directory=foo/bar"]),
+    (["--changed", "a.txt", "b.txt"], ["--changed=a.txt", "--changed=b.txt"]),
     # more complex
     (["-C", "foo/bar", "-l"], ["--directory=foo/bar", "--list"]),
     (
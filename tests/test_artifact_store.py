@@ -0,0 +1,67 @@
+import os
+
+from bygg.core.artifact_store import ArtifactStore
+
+
+def test_artifact_store_store_and_restore(tmp_path):
+    store = ArtifactStore(tmp_path / "cas")
+    output = tmp_path / "output"
+    output.write_text("content")
+
+    assert not store.restore("key", {str(output)})
+    assert store.store("key", {str(output)})
+
+    output.unlink()
+    assert store.restore("key", {str(output)})
+    assert output.read_text() == "content"
+    # Other outputs than the stored ones are not restored
+    assert not store.restore("key", {str(output), str(tmp_path / "other")})
+
+    assert (store.stats.hits, store.stats.misses, store.stats.stored) == (1, 2, 1)
+    store.save()
+    assert store.stats.hits == 0
+    totals = store.read_totals()
+    assert (totals.hits, totals.misses, totals.stored) == (1, 2, 1)
+
+
+def test_artifact_store_missing_output(tmp_path):
+    store = ArtifactStore(tmp_path / "cas")
+    assert not store.store("key", {str(tmp_path / "missing")})
+    assert not store.store("key", {str(tmp_path)})
+    assert store.read_manifest("key") is None
+
+
+def test_artifact_store_modified_blob(tmp_path):
+    store = ArtifactStore(tmp_path / "cas")
+    output = tmp_path / "output"
+    output.write_text("content")
+    store.store("key", {str(output)})
+
+    # Write through a hardlink from a restore, which changes the blob
+    output.unlink()
+    store.restore("key", {str(output)})
+    with open(output, "w") as f:
+        f.write("changed")
+
+    assert not store.restore("key", {str(output)})
+    assert output.read_text() == "changed"
+    assert store.read_manifest("key") is None
+
+
+def test_artifact_store_evict(tmp_path):
+    store = ArtifactStore(tmp_path / "cas", max_size=15)
+    for i, key in enumerate(["old", "middle", "new"]):
+        output = tmp_path / key
+        output.write_text(f"{key} content")
+        store.store(key, {str(output)})
+        os.utime(store.entries_dir / key, (i, i))
+
+    # Using an entry makes it the most recently used
+    (tmp_path / "old").unlink()
+    assert store.restore("old", {str(tmp_path / "old")})
+
+    store.save()
+    assert store.read_manifest("old") is not None
+    assert store.read_manifest("middle") is None
+    assert store.read_manifest("new") is None
+    assert len(list(store.objects_dir.iterdir())) == 1
@@ -1,8 +1,9 @@
 import os
 from pathlib import Path
+import pickle
 from tempfile import TemporaryDirectory, mkstemp
 
-from bygg.core.cache import Cache, InputsOutputsDigests
+from bygg.core.cache import SQLITE_HEADER, Cache, CacheState, InputsOutputsDigests
 
 
 def test_cache_load_non_existing():
@@ -42,3 +43,82 @@ def test_cache_write_and_load():
         assert cache2.data.digests == {
             "foo": InputsOutputsDigests("deadbeef", "f00", "f33d")
         }
+
+
+def test_cache_migrate_pickle(tmp_path):
+    db_file = tmp_path / "cache.db"
+    with open(db_file, "wb") as f:
+        pickle.dump(
+            CacheState({"foo": InputsOutputsDigests("deadbeef", "f00", None)}), f
+        )
+
+    cache = Cache(db_file)
+    cache.load()
+    assert cache.get_digests("foo") == InputsOutputsDigests("deadbeef", "f00", None)
+    cache.save()
+
+    with open(db_file, "rb") as f:
+        assert f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+
+
+def test_cache_set_and_remove(tmp_path):
+    db_file = tmp_path / "cache.db"
+    cache = Cache(db_file)
+    cache.load()
+    cache.set_digests("foo", "deadbeef", "f00")
+    cache.set_digests("bar", "deadbeef", "f00", "f33d")
+    cache.save()
+
+    cache2 = Cache(db_file)
+    cache2.load()
+    assert cache2.get_digests("bar") == InputsOutputsDigests("deadbeef", "f00", "f33d")
+    cache2.remove_digests("foo")
+    cache2.remove_digests("not_there")
+    assert cache2.get_digests("foo") is None
+    cache2.save()
+
+    cache3 = Cache(db_file)
+    cache3.load()
+    assert cache3.data is not None
+    assert set(cache3.data.digests) == {"bar"}
+
+
+def test_cache_commit_if_due(tmp_path):
+    db_file = tmp_path / "cache.db"
+    cache = Cache(db_file)
+    cache.load()
+    cache.set_digests("foo", "deadbeef", "f00")
+
+    # Nothing is written before the interval has passed
+    cache.commit_if_due()
+    interrupted = Cache(db_file)
+    interrupted.load()
+    assert interrupted.get_digests("foo") is None
+
+    # A later run sees the committed digests even if the cache was never saved
+    cache.commit_interval = 0
+    cache.commit_if_due()
+    resumed = Cache(db_file)
+    resumed.load()
+    assert resumed.get_digests("foo") == InputsOutputsDigests("deadbeef", "f00", None)
+    cache.save()
+
+
+def test_cache_concurrent_processes(tmp_path):
+    db_file = tmp_path / "cache.db"
+    cache1 = Cache(db_file)
+    cache2 = Cache(db_file)
+    cache1.load()
+    cache2.load()
+
+    cache1.set_digests("foo", "deadbeef", "f00")
+    cache2.set_digests("bar", "deadbeef", "ba4")
+    cache1.commit_interval = 0
+    cache1.commit_if_due()
+    cache2.save()
+    cache1.save()
+
+    merged = Cache(db_file)
+    merged.load()
+    assert merged.data is not None
+    assert set(merged.data.digests) == {"foo", "bar"}
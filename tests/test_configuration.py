@@ -0,0 +1,23 @@
+from bygg.cmd.configuration import read_config_files
+from bygg.cmd.environments import register_actions_from_configuration
+from bygg.util import DEFAULT_OUTPUT_TAIL_SIZE, ShellCommand
+
+
+def test_output_tail_size_setting(scheduler_fixture, tmp_path, monkeypatch):
+    scheduler, _ = scheduler_fixture
+    monkeypatch.chdir(tmp_path)
+
+    def register(toml: str) -> int:
+        (tmp_path / "Byggfile.toml").write_text(toml)
+        register_actions_from_configuration(read_config_files(), None)
+        command = scheduler.build_actions["action"].command
+        assert isinstance(command, ShellCommand)
+        return command.output_tail_size
+
+    assert register('[actions]\naction = "echo hello"\n') == DEFAULT_OUTPUT_TAIL_SIZE
+    assert (
+        register(
+            '[settings]\noutput_tail_size = 1000\n[actions]\naction = "echo hello"\n'
+        )
+        == 1000
+    )
@@ -0,0 +1,100 @@
+import pytest
+
+from bygg.core.action import Action
+from bygg.core.dag import IncrementalDag
+
+
+def test_incremental_dag_ready_order(scheduler_branching_actions):
+    scheduler, _ = scheduler_branching_actions
+    dag = IncrementalDag()
+    dag.build_action_graph(scheduler.build_actions, scheduler.build_actions["action1"])
+
+    assert len(dag) == 4
+    assert dag.get_ready_jobs({}, {}) == ["action4"]
+    # Nodes are only handed out once
+    assert dag.get_ready_jobs({}, {}) == []
+
+    dag.remove_node("action4")
+    assert sorted(dag.get_ready_jobs({}, {})) == ["action2", "action3"]
+
+    dag.remove_node("action2")
+    assert dag.get_ready_jobs({}, {}) == []
+
+    dag.remove_node("action3")
+    assert dag.get_ready_jobs({}, {}) == ["action1"]
+
+    dag.remove_node("action1")
+    assert len(dag) == 0
+
+
+def test_incremental_dag_failed_node_blocks(scheduler_branching_actions):
+    scheduler, _ = scheduler_branching_actions
+    dag = IncrementalDag()
+    dag.build_action_graph(scheduler.build_actions, scheduler.build_actions["action1"])
+
+    assert dag.get_ready_jobs({}, {}) == ["action4"]
+    dag.remove_node("action4")
+    assert sorted(dag.get_ready_jobs({}, {})) == ["action2", "action3"]
+
+    # action3 fails and is not removed, so action1 stays blocked
+    dag.remove_node("action2")
+    assert dag.get_ready_jobs({}, {"action3": None}) == []
+    assert len(dag) == 2
+
+
+def test_incremental_dag_remove_node_twice(scheduler_fixture):
+    scheduler, _ = scheduler_fixture
+    Action(name="a", dependencies=["b", "c"], is_entrypoint=True)
+    Action(name="b")
+    Action(name="c")
+
+    dag = IncrementalDag()
+    dag.build_action_graph(scheduler.build_actions, scheduler.build_actions["a"])
+    assert sorted(dag.get_ready_jobs({}, {})) == ["b", "c"]
+
+    dag.remove_node("b")
+    dag.remove_node("b")
+    assert dag.get_ready_jobs({}, {}) == []
+    dag.remove_node("c")
+    assert dag.get_ready_jobs({}, {}) == ["a"]
+
+
+def test_dag_diamond_visits_shared_dependencies_once(scheduler_fixture):
+    scheduler, _ = scheduler_fixture
+    # Each level depends on both nodes of the level below, which gives 2^levels paths
+    # from the top to the bottom.
+    levels = 30
+    for level in range(levels):
+        for side in ("l", "r"):
+            Action(
+                name=f"{side}{level}",
+                dependencies=[f"l{level + 1}", f"r{level + 1}"],
+            )
+    Action(name=f"l{levels}")
+    Action(name=f"r{levels}")
+    Action(name="top", dependencies=["l0", "r0"], is_entrypoint=True)
+
+    dag = IncrementalDag()
+    dag.build_action_graph(scheduler.build_actions, scheduler.build_actions["top"])
+    assert len(dag) == 2 * (levels + 1) + 1
+
+
+def test_dag_topological_order(scheduler_branching_actions):
+    scheduler, _ = scheduler_branching_actions
+    scheduler.prepare_run("action1")
+    order = scheduler.job_order
+
+    assert sorted(order) == ["action1", "action2", "action3", "action4"]
+    for name in order:
+        for dependency in scheduler.build_actions[name].dependencies:
+            assert order.index(dependency) < order.index(name)
+
+
+def test_dag_cycle_detection(scheduler_fixture):
+    scheduler, _ = scheduler_fixture
+    Action(name="a", dependencies=["b"], is_entrypoint=True)
+    Action(name="b", dependencies=["c"])
+    Action(name="c", dependencies=["a"])
+
+    with pytest.raises(ValueError, match="a -> b -> c -> a"):
+        scheduler.prepare_run("a")
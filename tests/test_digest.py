@@ -1,10 +1,15 @@
+import importlib
 import os
 from pathlib import Path
+import subprocess
+import sys
 import time
 
 import pytest
 
 from bygg.core.digest import (
+    FileDigestCache,
+    calculate_command_digest,
     calculate_dependency_digest,
     calculate_file_digest,
     file_digest_memo,
@@ -263,3 +268,86 @@ def test_calculate_dependency_digest_symlinks(tmp_path: Path, mocker):
     assert digests1 != digests2
     assert not was_missing2
     assert digest_spy.call_count == 2
+
+
+def test_file_digest_cache_persistence(tmp_path):
+    digests_file = tmp_path / "digests.db"
+
+    file = tmp_path / "file"
+    file.write_text("content")
+    removed_file = tmp_path / "removed_file"
+    removed_file.write_text("removed content")
+
+    def stat_key(path: Path):
+        st = os.stat(path)
+        return (st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+
+    cache1 = FileDigestCache(digests_file)
+    assert cache1.get(str(file), stat_key(file)) is None
+    cache1.set(str(file), stat_key(file), "digest")
+    cache1.set(str(removed_file), stat_key(removed_file), "removed digest")
+    cache1.save()
+
+    # A new run loads the digests lazily
+    cache2 = FileDigestCache(digests_file)
+    assert cache2.entries is None
+    assert cache2.get(str(file), stat_key(file)) == "digest"
+    assert cache2.get(str(file), (0, 0, 0, 0)) is None
+
+    # Files that no longer exist are evicted when saving
+    removed_file.unlink()
+    other_file = tmp_path / "other_file"
+    other_file.write_text("other content")
+    cache2.set(str(other_file), stat_key(other_file), "other digest")
+    cache2.save()
+    assert set(FileDigestCache(digests_file).read_file()) == {
+        str(file),
+        str(other_file),
+    }
+
+
+COMMAND_MODULE = """
+def make_command(suffix):
+    names = frozenset({"a", "b", "c"})
+
+    def command(ctx):
+        files = [f"{n}{suffix}" for n in sorted(names)]
+        key = lambda f: f.upper()
+
+        def inner():
+            return {f: key(f) for f in files}
+
+        return inner()
+
+    return command
+
+command = make_command(".txt")
+"""
+
+DIGEST_SCRIPT = """
+from bygg.core.digest import calculate_command_digest
+import digest_test_commands
+print(calculate_command_digest(digest_test_commands.command))
+"""
+
+
+def test_calculate_command_digest_is_stable_across_processes(tmp_path, monkeypatch):
+    (tmp_path / "digest_test_commands.py").write_text(COMMAND_MODULE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = importlib.import_module("digest_test_commands")
+    digest = calculate_command_digest(module.command)
+
+    # Nested code objects and sets must not make the digest differ between processes
+    for hash_seed in ("1", "2"):
+        result = subprocess.run(
+            [sys.executable, "-c", DIGEST_SCRIPT],
+            cwd=tmp_path,
+            env={**os.environ, "PYTHONHASHSEED": hash_seed},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert result.stdout.strip() == digest
+
+    assert calculate_command_digest(module.make_command(".md")) != digest
+    monkeypatch.delitem(sys.modules, "digest_test_commands")
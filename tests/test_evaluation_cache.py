@@ -0,0 +1,17 @@
+import importlib.metadata
+
+from bygg.cmd.configuration import Byggfile
+from bygg.cmd.evaluation_cache import calculate_evaluation_key
+
+
+def test_evaluation_key_without_installed_bygg(mocker, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert calculate_evaluation_key(Byggfile(), "default")
+
+    # E.g. when run from a source checkout; the evaluation is then not cached
+    mocker.patch.object(
+        importlib.metadata,
+        "version",
+        side_effect=importlib.metadata.PackageNotFoundError("bygg"),
+    )
+    assert calculate_evaluation_key(Byggfile(), "default") is None
@@ -151,6 +151,37 @@ def test_tree_non_existing_action(snapshot, clean_bygg_tree, example):
     assert process.stdout == snapshot
 
 
+def test_list_evaluation_cache(clean_bygg_tree):
+    example_dir = clean_bygg_tree / examples_dir / "trivial"
+
+    def list_actions():
+        process = subprocess.run(
+            ["bygg", "--list"],
+            cwd=example_dir,
+            capture_output=True,
+            encoding="utf-8",
+        )
+        assert process.returncode == 0
+        return process.stdout
+
+    (example_dir / "helper.py").write_text('DESCRIPTION = "First description"\n')
+    with open(example_dir / "Byggfile.py", "a") as f:
+        f.write(
+            "\n\nimport helper\n\n"
+            "Action('cached_action', is_entrypoint=True, "
+            "description=helper.DESCRIPTION)\n"
+        )
+
+    first_output = list_actions()
+    assert "First description" in first_output
+    assert (example_dir / ".bygg" / "evaluation_cache.db").is_file()
+    assert list_actions() == first_output
+
+    # Changing an imported local module invalidates the cached evaluation
+    (example_dir / "helper.py").write_text('DESCRIPTION = "Second description"\n')
+    assert "Second description" in list_actions()
+
+
 # TODO more tests:
 # --tree ACTION (one and several existing )
 
@@ -230,6 +261,29 @@ def test_build_multiple_actions(snapshot, clean_bygg_tree):
     assert "\n".join(sorted(cleaned_result)) == snapshot
 
 
+def test_build_multiple_actions_merged(clean_bygg_tree):
+    actions = [
+        "shorthand_action_toml",
+        "touch a file",
+        "shorthand action toml, with spaces",
+    ]
+    process = subprocess.run(
+        ["bygg", "-C", examples_dir / "taskrunner", "--merge-actions", *actions],
+        cwd=clean_bygg_tree,
+        capture_output=True,
+        encoding="utf-8",
+    )
+    assert process.returncode == 0
+    building_lines = [
+        line for line in process.stdout.split("\n") if "Building action" in line
+    ]
+    assert building_lines == [
+        "bygg >>> Building actions 'shorthand_action_toml', 'touch a file', 'shorthand action toml, with spaces':"
+    ]
+    for action in actions:
+        assert f"OK {action}" in process.stdout
+
+
 def test_build_verbose(snapshot, clean_bygg_tree):
     process = subprocess.run(
         [
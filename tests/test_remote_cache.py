@@ -0,0 +1,187 @@
+import re
+import shutil
+import socket
+import subprocess
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from bygg.cmd.cache_server import CacheServer, parse_address
+from bygg.core.action import Action, ActionContext
+from bygg.core.artifact_store import ArtifactStore
+from bygg.core.common_types import CommandStatus
+from bygg.core.remote_cache import RemoteArtifactCache
+from bygg.core.runner import ProcessRunner
+
+
+@pytest.fixture
+def cache_server(tmp_path):
+    """Run a cache server on a free port, returns its URL."""
+    server = CacheServer(("127.0.0.1", 0), tmp_path / "server")
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server.url
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def test_remote_cache_share_between_stores(cache_server, tmp_path):
+    outputs = [tmp_path / "output1", tmp_path / "output2"]
+    for i, output in enumerate(outputs):
+        output.write_text(f"content {i}")
+
+    store1 = ArtifactStore(tmp_path / "cas1", remote=RemoteArtifactCache(cache_server))
+    assert store1.store("abcdef0123", {str(o) for o in outputs})
+    # Waits for the uploads, which are done in the background
+    store1.save()
+
+    for output in outputs:
+        output.unlink()
+    store2 = ArtifactStore(
+        tmp_path / "cas2", remote=RemoteArtifactCache(cache_server, max_connections=2)
+    )
+    assert store2.restore("abcdef0123", {str(o) for o in outputs})
+    assert [o.read_text() for o in outputs] == ["content 0", "content 1"]
+    assert (store2.stats.hits, store2.stats.remote_hits) == (1, 1)
+    # Stored locally after the download
+    assert store2.read_manifest("abcdef0123") is not None
+
+    assert not store2.restore("0123abcdef", {str(o) for o in outputs})
+    assert store2.remote and store2.remote.available
+
+
+def test_remote_cache_server_rejects_wrong_digest(cache_server):
+    request = urllib.request.Request(
+        f"{cache_server}/cas/0123456789abcdef", data=b"content", method="PUT"
+    )
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(request)
+    assert e.value.code == 400
+
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(f"{cache_server}/cas/../secret")
+    assert e.value.code == 400
+
+
+def test_remote_cache_unreachable(tmp_path):
+    output = tmp_path / "output"
+    output.write_text("content")
+
+    # Nothing listens on port 1
+    remote = RemoteArtifactCache("http://127.0.0.1:1", timeout=1.0)
+    store = ArtifactStore(tmp_path / "cas", remote=remote)
+    assert not store.restore("abcdef0123", {str(output)})
+    assert not remote.available
+    # The local store still works
+    assert store.store("abcdef0123", {str(output)})
+    output.unlink()
+    assert store.restore("abcdef0123", {str(output)})
+
+
+def test_remote_cache_restores_in_build(scheduler_fixture, cache_server, tmp_path):
+    scheduler, _ = scheduler_fixture
+    output = tmp_path / "output"
+    builds: list[str] = []
+
+    def build(ctx: ActionContext):
+        builds.append(ctx.name)
+        output.write_text("content")
+        return CommandStatus(0, "Built", None)
+
+    Action(
+        "build",
+        is_entrypoint=True,
+        outputs=[str(output)],
+        command=build,
+        scheduling_type="thread",
+    )
+
+    def run():
+        scheduler.start_run("build", remote_cache=cache_server)
+        assert ProcessRunner(scheduler).start(1) == []
+        assert scheduler.run_status() == "finished"
+        scheduler.shutdown()
+
+    run()
+    # Like on another machine, with an empty local store
+    shutil.rmtree(scheduler.artifact_store_dir)
+    output.unlink()
+    run()
+    assert builds == ["build"]
+    assert output.read_text() == "content"
+    assert (
+        scheduler.artifact_store
+        and scheduler.artifact_store.read_totals().remote_hits == 1
+    )
+
+
+def test_remote_cache_hanging_server_does_not_hold_up_build(
+    scheduler_fixture, tmp_path
+):
+    scheduler, _ = scheduler_fixture
+    released = threading.Event()
+    released_by_build: list[bool] = []
+
+    def hanging_server(listener: socket.socket):
+        # Accepts the first request and doesn't answer it until released
+        connection, _ = listener.accept()
+        with connection:
+            released_by_build.append(released.wait(timeout=5.0))
+
+    def cached(ctx: ActionContext):
+        (tmp_path / "output").write_text("content")
+        return CommandStatus(0, "Built", None)
+
+    def release(ctx: ActionContext):
+        released.set()
+        return CommandStatus(0, "Released", None)
+
+    Action("cached", outputs=[str(tmp_path / "output")], command=cached)
+    Action("release", command=release, scheduling_type="thread")
+
+    with socket.create_server(("127.0.0.1", 0)) as listener:
+        thread = threading.Thread(target=hanging_server, args=(listener,))
+        thread.start()
+        host, port = listener.getsockname()[:2]
+        scheduler.start_run(["cached", "release"], remote_cache=f"http://{host}:{port}")
+        assert scheduler.artifact_store and scheduler.artifact_store.remote
+        scheduler.artifact_store.remote.timeout = 5.0
+        assert ProcessRunner(scheduler).start(1) == []
+        thread.join()
+
+    # The other job ran while the download was waiting for the server
+    assert released_by_build == [True]
+    assert scheduler.run_status() == "finished"
+    assert (tmp_path / "output").read_text() == "content"
+    assert not scheduler.artifact_store.remote.available
+
+
+def test_cache_server_parse_address():
+    assert parse_address(None) == ("127.0.0.1", 8765)
+    assert parse_address("0.0.0.0") == ("0.0.0.0", 8765)
+    assert parse_address(":9000") == ("127.0.0.1", 9000)
+    assert parse_address("example.com:9000") == ("example.com", 9000)
+
+
+def test_cache_server_maintenance_command(tmp_path):
+    # Runs without a Byggfile, until it's stopped
+    with subprocess.Popen(
+        ["bygg", "--cache-server", "--cache-server-address", "127.0.0.1:0"],
+        cwd=tmp_path,
+        stdout=subprocess.PIPE,
+        text=True,
+    ) as process:
+        try:
+            assert process.stdout
+            line = process.stdout.readline()
+            match = re.search(r"http://[\d.]+:\d+", line)
+            assert match, line
+            with pytest.raises(urllib.error.HTTPError) as e:
+                urllib.request.urlopen(f"{match.group(0)}/ac/0123456789abcdef")
+            assert e.value.code == 404
+        finally:
+            process.terminate()
+    assert (tmp_path / ".bygg" / "cache-server" / "cas").is_dir()
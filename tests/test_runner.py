@@ -0,0 +1,482 @@
+import asyncio
+from collections import deque
+import os
+from pathlib import Path
+import random
+import resource
+import signal
+import sys
+import threading
+import time
+
+from bygg.core.action import (
+    Action,
+    ActionContext,
+    CommandStatus,
+    WorkChannel,
+    preload_modules,
+)
+from bygg.core.job import Job
+import bygg.core.runner
+from bygg.core.runner import (
+    RU_MAXRSS_UNIT,
+    DispatchQueue,
+    ProcessRunner,
+    WorkerPool,
+    run_measured,
+)
+from bygg.util import create_shell_command
+
+
+def quick_command(ctx: ActionContext):
+    return CommandStatus(0, "Executed successfully", None)
+
+
+def test_runner_chain_of_quick_jobs(scheduler_fixture):
+    scheduler, _ = scheduler_fixture
+    job_count = 20
+    for i in range(job_count):
+        Action(
+            name=f"action{i}",
+            dependencies=[f"action{i + 1}"] if i + 1 < job_count else [],
+            is_entrypoint=i == 0,
+            command=quick_command,
+        )
+
+    events: list[tuple[str, str]] = []
+    runner = ProcessRunner(scheduler)
+    runner.job_status_listener = lambda status, job, _: events.append(
+        (status, job.name)
+    )
+
+    scheduler.start_run("action0")
+    t1 = time.perf_counter()
+    assert runner.start(2) == []
+    duration = time.perf_counter() - t1
+
+    assert scheduler.run_status() == "finished"
+    assert len(scheduler.finished_jobs) == job_count
+    # Each job is reported as running once, before it finishes
+    for i in reversed(range(job_count)):
+        assert events.count(("running", f"action{i}")) == 1
+        assert events.index(("running", f"action{i}")) < events.index(
+            ("finished", f"action{i}")
+        )
+    # Dependents are started as soon as a job finishes, without waiting for a poll
+    # interval between each job
+    assert duration < 0.1 * job_count
+
+
+def test_runner_does_not_send_actions_to_workers(scheduler_fixture, tmp_path):
+    scheduler, _ = scheduler_fixture
+    # A lock can't be pickled, so the action can only run if it isn't sent
+    lock = threading.Lock()
+    outfile = tmp_path / "outfile"
+
+    def command(ctx: ActionContext):
+        with lock:
+            outfile.write_text(str(os.getpid()))
+        return CommandStatus(0, "Executed successfully", None)
+
+    Action("action", is_entrypoint=True, outputs=[str(outfile)], command=command)
+
+    runner = ProcessRunner(scheduler)
+    scheduler.start_run("action")
+    assert runner.start(1) == []
+
+    job = scheduler.finished_jobs["action"]
+    assert job.status and job.status.rc == 0
+    assert job.duration is not None
+    assert outfile.read_text() != str(os.getpid())
+
+
+def test_worker_pool_is_kept_between_runs(scheduler_fixture):
+    scheduler, _ = scheduler_fixture
+
+    def worker_pid(ctx: ActionContext):
+        return CommandStatus(0, str(os.getpid()), None)
+
+    Action("action", is_entrypoint=True, command=worker_pid)
+
+    def run() -> str:
+        runner = ProcessRunner(scheduler, worker_pool)
+        scheduler.start_run("action", always_make=True)
+        assert runner.start(1) == []
+        status = scheduler.finished_jobs["action"].status
+        assert status and status.rc == 0
+        return status.message
+
+    with WorkerPool() as worker_pool:
+        first_pid = run()
+        assert run() == first_pid
+        # The workers don't know about new actions, so they are replaced
+        Action("another_action", command=worker_pid)
+        assert run() != first_pid
+    assert worker_pool.executor is None
+
+
+def test_worker_pool_picks_up_changed_shell_command(scheduler_fixture):
+    scheduler, _ = scheduler_fixture
+
+    def run(message: str) -> str | None:
+        # Recreated like when a Byggfile is evaluated again in watch mode
+        Action("action", is_entrypoint=True, command=create_shell_command(message))
+        runner = ProcessRunner(scheduler, worker_pool)
+        scheduler.start_run("action", always_make=True)
+        assert runner.start(1) == []
+        status = scheduler.finished_jobs["action"].status
+        assert status and status.rc == 0
+        return status.output
+
+    with WorkerPool() as worker_pool:
+        assert run("echo first") == "first\n"
+        assert run("echo second") == "second\n"
+
+
+def test_worker_pool_picks_up_changed_inputs(scheduler_fixture, tmp_path):
+    scheduler, _ = scheduler_fixture
+
+    def list_inputs(ctx: ActionContext):
+        return CommandStatus(
+            0, ",".join(sorted(Path(f).name for f in ctx.inputs)), None
+        )
+
+    def run(*inputs: str) -> str:
+        # Like a Byggfile that globs its inputs when it is evaluated again
+        for name in inputs:
+            (tmp_path / name).touch()
+        Action(
+            "action",
+            is_entrypoint=True,
+            inputs=[str(tmp_path / name) for name in inputs],
+            command=list_inputs,
+        )
+        runner = ProcessRunner(scheduler, worker_pool)
+        scheduler.start_run("action", always_make=True)
+        assert runner.start(1) == []
+        status = scheduler.finished_jobs["action"].status
+        assert status and status.rc == 0
+        return status.message
+
+    with WorkerPool() as worker_pool:
+        assert run("a.txt") == "a.txt"
+        assert run("a.txt", "b.txt") == "a.txt,b.txt"
+
+
+def test_worker_pool_replaces_broken_workers(scheduler_fixture):
+    scheduler, _ = scheduler_fixture
+
+    def worker_pid(ctx: ActionContext):
+        return CommandStatus(0, str(os.getpid()), None)
+
+    Action("action", is_entrypoint=True, command=worker_pid)
+
+    def run() -> str:
+        runner = ProcessRunner(scheduler, worker_pool)
+        scheduler.start_run("action", always_make=True)
+        assert runner.start(1) == []
+        status = scheduler.finished_jobs["action"].status
+        assert status and status.rc == 0
+        return status.message
+
+    with WorkerPool() as worker_pool:
+        first_pid = run()
+        os.kill(int(first_pid), signal.SIGKILL)
+        deadline = time.monotonic() + 10
+        while worker_pool.is_usable() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not worker_pool.is_usable()
+        second_pid = run()
+        assert second_pid != first_pid
+
+        assert worker_pool.executor
+        worker_pool.executor.shutdown()
+        assert run() != second_pid
+
+
+def test_runner_preloads_modules(scheduler_fixture, tmp_path, monkeypatch):
+    scheduler, _ = scheduler_fixture
+    monkeypatch.syspath_prepend(str(tmp_path))
+    (tmp_path / "bygg_preload_test.py").write_text("import os\nPID = os.getpid()\n")
+
+    def command(ctx: ActionContext):
+        module = sys.modules.get("bygg_preload_test")
+        return CommandStatus(0, str(module and module.PID), None)
+
+    # Written to a file, since the workers' output isn't captured here
+    warnings_file = tmp_path / "warnings.txt"
+
+    def output_warning(s: str):
+        with open(warnings_file, "a") as f:
+            f.write(f"{s}\n")
+
+    monkeypatch.setattr(bygg.core.runner, "output_warning", output_warning)
+
+    Action("action", is_entrypoint=True, command=command)
+    preload_modules("bygg_preload_test", "bygg_module_that_does_not_exist")
+
+    runner = ProcessRunner(scheduler)
+    scheduler.start_run("action")
+    assert runner.start(2) == []
+
+    # Imported in this process, before the worker was forked
+    status = scheduler.finished_jobs["action"].status
+    assert status and status.message == str(os.getpid())
+    monkeypatch.delitem(sys.modules, "bygg_preload_test")
+
+    # Only warned about in this process, not by every worker
+    assert warnings_file.read_text().splitlines() == [
+        "Could not preload module 'bygg_module_that_does_not_exist': "
+        "No module named 'bygg_module_that_does_not_exist'"
+    ]
+
+
+def test_run_measured_peak_rss_only_when_raised(scheduler_fixture, mocker):
+    def usage(maxrss: int):
+        return mocker.Mock(ru_utime=0.0, ru_stime=0.0, ru_maxrss=maxrss)
+
+    # (self, children) before and after each job
+    getrusage = mocker.patch.object(resource, "getrusage")
+    getrusage.side_effect = [usage(100), usage(10), usage(500), usage(10)]
+    job = Job(Action("large", command=quick_command))
+    run_measured(job, lambda: quick_command(job.action))
+    assert job.peak_rss == 500 * RU_MAXRSS_UNIT
+
+    # The high-water mark is from the earlier job
+    getrusage.side_effect = [usage(500), usage(10), usage(500), usage(10)]
+    job = Job(Action("small", command=quick_command))
+    run_measured(job, lambda: quick_command(job.action))
+    assert job.peak_rss is None
+
+
+def test_dispatch_queue_work_channel(scheduler_fixture):
+    channel = WorkChannel("channel", width=1)
+    jobs = [
+        Job(Action(f"action{i}", command=quick_command, work_channel=channel))
+        for i in range(3)
+    ]
+    free_job = Job(Action("free", command=quick_command))
+
+    dispatch_queue = DispatchQueue()
+    for priority, job in zip([4, 3, 2, 1], [*jobs, free_job]):
+        dispatch_queue.push(job, priority)
+
+    assert dispatch_queue.pop() is jobs[0]
+    # The other channel jobs wait for the channel
+    assert dispatch_queue.pop() is free_job
+    assert dispatch_queue.pop() is None
+    assert len(dispatch_queue) == 2
+
+    dispatch_queue.release(jobs[0])
+    assert dispatch_queue.pop() is jobs[1]
+    dispatch_queue.release(jobs[1])
+    assert dispatch_queue.pop() is jobs[2]
+    assert len(dispatch_queue) == 0
+
+
+def time_dispatch(jobs: list[Job], workers: int, repeats: int) -> float:
+    """
+    Dispatch the jobs through a DispatchQueue with a number of workers that each finish
+    their job in turn, returns the best CPU time per job of the repeats. CPU time isn't
+    affected by other processes that run at the same time, like wall-clock time is.
+    """
+    random.seed(0)
+    priorities = [random.random() for _ in jobs]
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.process_time()
+        dispatch_queue = DispatchQueue()
+        for job, priority in zip(jobs, priorities):
+            dispatch_queue.push(job, priority)
+        running: deque[Job] = deque()
+        while len(dispatch_queue) or running:
+            while len(running) < workers and (next_ready := dispatch_queue.pop()):
+                running.append(next_ready)
+            dispatch_queue.release(running.popleft())
+        best = min(best, time.process_time() - start)
+    return best / len(jobs)
+
+
+def test_dispatch_queue_overhead_is_flat(scheduler_fixture):
+    """
+    The time per job to push, pop and release it must not grow much from 1k to 100k
+    jobs. It is about 2-4 times higher for 100k jobs, from the O(log n) heap and cache
+    effects. A cost per job that grows linearly would make it about 100 times higher.
+    """
+    channels = [WorkChannel(f"channel{i}", width=2) for i in range(4)]
+    jobs = [
+        Job(
+            Action(
+                f"action{i}",
+                command=quick_command,
+                # Every other job is in a work channel
+                work_channel=channels[i % 8 // 2] if i % 2 else None,
+            )
+        )
+        for i in range(100_000)
+    ]
+
+    small = time_dispatch(jobs[:1_000], 8, repeats=20)
+    large = time_dispatch(jobs, 8, repeats=3)
+    assert large < 10 * small
+
+
+def test_runner_thread_scheduling_type(scheduler_fixture):
+    scheduler, _ = scheduler_fixture
+    job_count = 8
+    barrier = threading.Barrier(job_count, timeout=10)
+
+    def command(ctx: ActionContext):
+        # Only passes if all jobs run at the same time in this process
+        barrier.wait()
+        return CommandStatus(0, f"{os.getpid()}", None)
+
+    for i in range(job_count):
+        Action(f"action{i}", scheduling_type="thread", command=command)
+    Action(
+        "all",
+        is_entrypoint=True,
+        dependencies=[f"action{i}" for i in range(job_count)],
+    )
+
+    runner = ProcessRunner(scheduler)
+    scheduler.start_run("all")
+    assert runner.start(1, job_count) == []
+
+    for i in range(job_count):
+        job = scheduler.finished_jobs[f"action{i}"]
+        assert job.status and job.status.message == str(os.getpid())
+        assert job.duration is not None and job.cpu_time is None
+
+
+def test_runner_in_process_scheduling_type(scheduler_fixture, tmp_path):
+    scheduler, _ = scheduler_fixture
+    marker = tmp_path / "marker"
+
+    def wait_for_marker(ctx: ActionContext):
+        # Only passes if the runner dispatches other jobs while this one runs
+        deadline = time.monotonic() + 10
+        while not marker.exists():
+            if time.monotonic() > deadline:
+                return CommandStatus(1, "Timed out", None)
+            time.sleep(0.01)
+        return CommandStatus(0, threading.current_thread().name, None)
+
+    def write_marker(ctx: ActionContext):
+        marker.write_text("done")
+        return CommandStatus(0, "Wrote marker", None)
+
+    Action("wait", scheduling_type="in-process", command=wait_for_marker)
+    Action("write", command=write_marker)
+    Action("all", is_entrypoint=True, dependencies=["wait", "write"])
+
+    runner = ProcessRunner(scheduler)
+    scheduler.start_run("all")
+    assert runner.start(1) == []
+
+    job = scheduler.finished_jobs["wait"]
+    assert job.status and job.status.rc == 0
+    assert job.status.message != threading.main_thread().name
+
+
+def test_runner_async_scheduling_type(scheduler_fixture, tmp_path, monkeypatch):
+    scheduler, _ = scheduler_fixture
+    # The output of the shell commands is logged in the current directory
+    monkeypatch.chdir(tmp_path)
+    job_count = 40
+    for i in range(job_count):
+        Action(
+            f"action{i}",
+            outputs=[str(tmp_path / f"out{i}")],
+            scheduling_type="async",
+            command=create_shell_command(f"sleep 0.5 && echo {i} > {tmp_path}/out{i}"),
+        )
+    Action(
+        "all",
+        is_entrypoint=True,
+        dependencies=[f"action{i}" for i in range(job_count)],
+    )
+
+    runner = ProcessRunner(scheduler)
+    scheduler.start_run("all")
+    t1 = time.perf_counter()
+    assert runner.start(1, 1, job_count) == []
+    # All run at the same time, without any workers
+    assert time.perf_counter() - t1 < 0.5 * job_count / 4
+
+    for i in range(job_count):
+        assert (tmp_path / f"out{i}").read_text() == f"{i}\n"
+
+
+def test_runner_async_def_commands(scheduler_fixture):
+    scheduler, _ = scheduler_fixture
+    job_count = 200
+    running = 0
+    max_running = 0
+
+    async def command(ctx: ActionContext):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.2)
+        running -= 1
+        return CommandStatus(0, "Executed successfully", None)
+
+    for i in range(job_count):
+        Action(f"action{i}", command=command)
+    Action(
+        "all",
+        is_entrypoint=True,
+        dependencies=[f"action{i}" for i in range(job_count)],
+    )
+    assert scheduler.build_actions["action0"].scheduling_type == "async"
+
+    runner = ProcessRunner(scheduler)
+    scheduler.start_run("all")
+    assert runner.start(1, 1, 50) == []
+
+    assert len(scheduler.finished_jobs) == job_count + 1
+    # The jobs are run concurrently up to the limit
+    assert max_running == 50
+
+
+def test_runner_async_jobs_default_to_job_count(scheduler_fixture):
+    scheduler, _ = scheduler_fixture
+    running = 0
+    max_running = 0
+
+    async def command(ctx: ActionContext):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        return CommandStatus(0, "Executed successfully", None)
+
+    for i in range(10):
+        Action(f"action{i}", command=command)
+    Action("all", is_entrypoint=True, dependencies=[f"action{i}" for i in range(10)])
+
+    runner = ProcessRunner(scheduler)
+    scheduler.start_run("all")
+    assert runner.start(2) == []
+    # E.g. -j 1 runs the shell commands from Byggfile.toml one at a time
+    assert max_running == 2
+
+
+def test_runner_async_def_command_in_worker(scheduler_fixture):
+    scheduler, _ = scheduler_fixture
+
+    async def command(ctx: ActionContext):
+        await asyncio.sleep(0)
+        return CommandStatus(0, f"{os.getpid()}", None)
+
+    Action("action", is_entrypoint=True, scheduling_type="processpool", command=command)
+
+    runner = ProcessRunner(scheduler)
+    scheduler.start_run("action")
+    assert runner.start(1) == []
+
+    job = scheduler.finished_jobs["action"]
+    assert job.status and job.status.rc == 0
+    assert job.status.message != str(os.getpid())
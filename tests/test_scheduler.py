@@ -1,3 +1,5 @@
+import os
+
 import pytest
 
 from bygg.core.action import Action, ActionContext, CommandStatus
@@ -437,3 +439,195 @@ def test_scheduler_single_file_changed(scheduler_fixture, tmp_path):
 
     assert len(scheduler.job_graph) == 0
     assert scheduler.run_status() == "finished"
+
+
+def test_scheduler_critical_path_first(scheduler_fixture):
+    scheduler, _ = scheduler_fixture
+
+    Action(name="top", dependencies=["short", "long1"], is_entrypoint=True)
+    Action(name="short")
+    Action(name="long1", dependencies=["long2"])
+    Action(name="long2")
+
+    scheduler.timings.add_timing("short", 5.0)
+    scheduler.timings.add_timing("long1", 3.0)
+    scheduler.timings.add_timing("long2", 3.0)
+    scheduler.timings.add_timing("top", 1.0)
+    scheduler.timings.save()
+
+    scheduler.start_run("top")
+    assert scheduler.priorities == {
+        "top": 1.0,
+        "short": 6.0,
+        "long1": 4.0,
+        "long2": 7.0,
+    }
+
+    # long2 has the longest remaining path, so it should be started first
+    job = scheduler.get_ready_jobs(1)[0]
+    assert job.name == "long2"
+    job2 = scheduler.get_ready_jobs(1)[0]
+    assert job2.name == "short"
+
+    # Remaining work is 12 s over two workers, but the longest path is 7 s
+    assert scheduler.estimate_remaining_time(2) == 7.0
+    assert scheduler.estimate_remaining_time(1) == 12.0
+
+    job.status = CommandStatus(0, "Executed successfully", None)
+    job.duration = 2.0
+    scheduler.job_finished(job)
+    assert [t.wall_time for t in scheduler.timings.get_history("long2")] == [3.0, 2.0]
+    assert scheduler.estimate_remaining_time(1) == 9.0
+
+
+def test_scheduler_no_critical_path(scheduler_branching_actions):
+    scheduler, _ = scheduler_branching_actions
+
+    scheduler.start_run("action1", critical_path=False)
+    assert scheduler.priorities == {}
+    job = scheduler.get_ready_jobs(1)[0]
+    assert job.name == "action4"
+
+
+def test_scheduler_changed_files(scheduler_fixture):
+    scheduler, _ = scheduler_fixture
+
+    Action(name="top", dependencies=["a", "b"], is_entrypoint=True)
+    Action(name="a", inputs=["a.txt"], outputs=["a.out"])
+    Action(name="b", dependencies=["c"], inputs=["b.txt"])
+    Action(name="c", inputs=["c.txt"], outputs=["c.out"])
+
+    scheduler.prepare_run("top")
+    assert scheduler.find_affected_jobs(["a.txt"]) == {"a", "top"}
+    # c.out is read by b through the dependency on c
+    assert scheduler.find_affected_jobs(["c.out"]) == {"b", "top"}
+    assert scheduler.find_affected_jobs(["c.txt"]) == {"c", "b", "top"}
+    assert scheduler.find_affected_jobs(["unrelated.txt"]) == set()
+
+    scheduler.start_run("top", changed_files=["a.txt"], critical_path=False)
+    # b and c are not affected, so they are skipped without being checked
+    job = scheduler.get_ready_jobs(1)[0]
+    assert job.name == "a"
+    assert scheduler.get_ready_jobs() == []
+    job.status = CommandStatus(0, "Executed successfully", None)
+    scheduler.job_finished(job)
+    assert [j.name for j in scheduler.get_ready_jobs()] == ["top"]
+
+
+def test_scheduler_prefetch_digests(scheduler_fixture, tmp_path, mocker):
+    import bygg.core.digest
+    import bygg.core.scheduler
+
+    scheduler, _ = scheduler_fixture
+
+    files = [tmp_path / f"file{i}" for i in range(3)]
+    for file in files:
+        file.write_text(f"content for {file.name}")
+    shared, only_a, only_b = (str(f) for f in files)
+
+    Action(name="top", dependencies=["a", "b"], is_entrypoint=True)
+    Action(name="a", inputs=[shared, only_a])
+    Action(name="b", inputs=[shared, only_b])
+
+    digest_spy = mocker.spy(bygg.core.digest, "file_digest")
+    prefetch_spy = mocker.spy(bygg.core.scheduler, "prefetch_file_digests")
+    scheduler.start_run("top", digest_jobs=4)
+    jobs = scheduler.get_ready_jobs()
+    assert {job.name for job in jobs} == {"a", "b"}
+    prefetch_spy.assert_called_once_with({shared, only_a, only_b}, 4)
+
+    # Each file is hashed once, also when the input digests are stored for the jobs
+    assert sorted(call.args[0] for call in digest_spy.call_args_list) == sorted(
+        os.path.realpath(f) for f in files
+    )
+
+
+def test_scheduler_digest_context(scheduler_fixture, tmp_path, mocker):
+    import bygg.core.digest
+
+    scheduler, cache_file = scheduler_fixture
+
+    input_file = tmp_path / "input"
+    input_file.write_text("input")
+    output_file = tmp_path / "output"
+    dynamic_dependency = mocker.Mock(return_value="foo")
+
+    def create_actions():
+        Action(name="top", dependencies=["file"], is_entrypoint=True)
+        Action(
+            name="file",
+            inputs=[str(input_file)],
+            outputs=[str(output_file)],
+            dynamic_dependency=dynamic_dependency,
+        )
+
+    def run_file_job():
+        job = scheduler.get_ready_jobs()[0]
+        assert job.name == "file"
+        output_file.write_text("output")
+        job.status = CommandStatus(0, "Executed successfully", None)
+        scheduler.job_finished(job)
+
+    create_actions()
+    scheduler.start_run("top")
+    run_file_job()
+    scheduler.shutdown()
+
+    # Change the input and run again. The dirty check and storing the input digests
+    # share the digests and the result of the dynamic dependency.
+    input_file.write_text("changed input")
+    dynamic_dependency.reset_mock()
+    digest_spy = mocker.spy(bygg.core.digest, "calculate_file_digest")
+    scheduler.__init__()
+    scheduler.init_cache(cache_file)
+    create_actions()
+    scheduler.start_run("top")
+    run_file_job()
+
+    assert dynamic_dependency.call_count == 1
+    # The input once, and the output before and after the job ran
+    assert sorted(call.args[0] for call in digest_spy.call_args_list) == sorted(
+        [str(input_file), str(output_file), str(output_file)]
+    )
+
+
+def test_scheduler_artifact_cache(scheduler_fixture, tmp_path):
+    scheduler, cache_file = scheduler_fixture
+    infile = tmp_path / "infile"
+    outfile = tmp_path / "outfile"
+
+    def action1(ctx: ActionContext):
+        outfile.write_text(f"built from {infile.read_text()}")
+        return CommandStatus(0, "Executed successfully", None)
+
+    def run(content: str) -> int:
+        """Run the action with the given input, returns the number of jobs run."""
+        infile.write_text(content)
+        scheduler.__init__()
+        scheduler.init_cache(cache_file)
+        Action(
+            name="file",
+            is_entrypoint=True,
+            inputs=[str(infile)],
+            outputs=[str(outfile)],
+            command=action1,
+        )
+        scheduler.start_run("file", artifact_cache=True)
+        job_list = scheduler.get_ready_jobs()
+        for job in job_list:
+            job.status = job.action.command(job.action)
+            scheduler.job_finished(job)
+        assert scheduler.run_status() == "finished"
+        scheduler.shutdown()
+        return len(job_list)
+
+    assert run("a") == 1
+    assert run("b") == 1
+    # Back to an input that has been built before
+    assert run("a") == 0
+    assert outfile.read_text() == "built from a"
+    # Up to date, so the artifact store is not consulted
+    assert run("a") == 0
+
+    totals = scheduler.artifact_store.read_totals()
+    assert (totals.hits, totals.misses, totals.stored) == (1, 2, 2)
@@ -0,0 +1,101 @@
+from dataclasses import dataclass
+from pathlib import Path
+import pickle
+
+import pytest
+
+from bygg.cmd.stats import print_stats, sparkline
+import bygg.core.timings as timings_module
+from bygg.core.timings import HISTORY_LENGTH, Timings
+
+
+def test_timings_write_and_load(tmp_path: Path):
+    timings = Timings(tmp_path / "timings.db")
+    timings.load()
+    assert timings.get_duration("foo") is None
+
+    timings.add_timing("foo", 1.0, 0.5, 1024)
+    timings.add_timing("foo", 3.0, 0.5, 2048)
+    timings.add_timing("foo", 2.0)
+    timings.save()
+
+    timings2 = Timings(tmp_path / "timings.db")
+    timings2.load()
+    assert timings2.get_duration("foo") == 2.0
+    assert [t.wall_time for t in timings2.get_history("foo")] == [1.0, 3.0, 2.0]
+    assert timings2.get_history("foo")[1].peak_rss == 2048
+
+
+def test_timings_load_old_format(tmp_path: Path):
+    # The format from before the history was kept, with the same class name
+    @dataclass
+    class TimingsState:
+        durations: dict[str, float]
+
+    TimingsState.__module__ = timings_module.__name__
+    TimingsState.__qualname__ = "TimingsState"
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(timings_module, "TimingsState", TimingsState)
+        with open(tmp_path / "timings.db", "wb") as f:
+            pickle.dump(TimingsState({"foo": 1.0}), f)
+
+    timings = Timings(tmp_path / "timings.db")
+    timings.load()
+    assert timings.get_duration("foo") is None
+    timings.add_timing("foo", 2.0)
+    timings.save()
+    assert (
+        Timings(tmp_path / "timings.db").read_file().history["foo"][0].wall_time == 2.0
+    )
+
+
+def test_timings_history_is_bounded(tmp_path: Path):
+    timings = Timings(tmp_path / "timings.db")
+    for i in range(HISTORY_LENGTH + 5):
+        timings.add_timing("foo", float(i))
+    history = timings.get_history("foo")
+    assert len(history) == HISTORY_LENGTH
+    assert history[0].wall_time == 5.0
+    assert history[-1].wall_time == float(HISTORY_LENGTH + 4)
+
+
+def test_sparkline():
+    assert sparkline([1.0, 1.0]) == "▁▁"
+    assert sparkline([0.0, 7.0, 3.5]) == "▁█▅"
+
+
+def test_print_stats(tmp_path: Path, capsys):
+    timings = Timings(tmp_path / "timings.db")
+    timings.add_timing("fast", 0.1)
+    timings.add_timing("slow", 10.0, 9.0, 1024 * 1024)
+    timings.add_timing("slow", 20.0, 19.0, 2 * 1024 * 1024)
+    timings.save()
+
+    print_stats(Timings(tmp_path / "timings.db"))
+    stdout, _ = capsys.readouterr()
+    lines = stdout.splitlines()
+    slow_line = next(line for line in lines if line.startswith("slow"))
+    fast_line = next(line for line in lines if line.startswith("fast"))
+    assert lines.index(slow_line) < lines.index(fast_line)
+    assert "15.00" in slow_line
+    assert "2 MiB" in slow_line
+    assert "+100%" in slow_line
+
+
+def test_timings_merge_on_save(tmp_path: Path):
+    # Two bygg processes that run at the same time
+    timings1 = Timings(tmp_path / "timings.db")
+    timings2 = Timings(tmp_path / "timings.db")
+    timings1.load()
+    timings2.load()
+
+    timings1.add_timing("foo", 1.0)
+    timings2.add_timing("foo", 2.0)
+    timings2.add_timing("bar", 3.0)
+    timings1.save()
+    timings2.save()
+
+    merged = Timings(tmp_path / "timings.db")
+    merged.load()
+    assert [t.wall_time for t in merged.get_history("foo")] == [1.0, 2.0]
+    assert merged.get_duration("bar") == 3.0
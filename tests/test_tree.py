@@ -75,3 +75,16 @@ def test_tree_branching_actions(
     )
     stdout, _ = capsys.readouterr()
     assert stdout == snapshot
+
+
+def test_tree_cycle(scheduler_fixture, create_byggcontext, capsys):
+    scheduler, _ = scheduler_fixture
+    Action(name="cycle_A", dependencies=["cycle_B"], is_entrypoint=True)
+    Action(name="cycle_B", dependencies=["cycle_A"])
+    ctx = create_byggcontext(scheduler)
+    assert Action._current_environment
+    print_tree(
+        tree_collect_for_environment(ctx, Action._current_environment), ["cycle_A"]
+    )
+    stdout, _ = capsys.readouterr()
+    assert "cycle_A (cycle)" in stdout
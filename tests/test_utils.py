@@ -1,7 +1,17 @@
+import asyncio
+from pathlib import Path
+import time
+
 import pytest
 
 from bygg.core.action import Action
-from bygg.util import create_shell_command, filenames_from_pattern
+from bygg.core.async_engine import AsyncEngine
+from bygg.util import (
+    JOB_LOG_DIR,
+    SHELL_COMMAND_TIMEOUT_RC,
+    create_shell_command,
+    filenames_from_pattern,
+)
 
 test_cases_filenames_from_pattern = [
     (
@@ -93,11 +103,82 @@ def test_filenames_from_pattern(test_case):
     assert not result.unmatched_input_files
 
 
-def test_shell_command():
-    Action._current_environment = "test_shell_command"
+@pytest.fixture
+def in_tmp_path(tmp_path, monkeypatch):
+    """Run in tmp_path, so that the log files of shell commands are written there."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_shell_command(scheduler_fixture, in_tmp_path):
     shell_command = create_shell_command("echo 'shell action output'")
 
     status = shell_command(Action("test context", inputs=set(), outputs=set()))
     assert status.rc == 0
     assert status.output == "shell action output\n"
-    Action._current_environment = None
+
+
+def test_shell_command_timeout(scheduler_fixture, in_tmp_path):
+    ctx = Action("test context", inputs=set(), outputs=set())
+    shell_command = create_shell_command("echo started; sleep 10", timeout=0.5)
+
+    status = shell_command(ctx)
+    assert status.rc == SHELL_COMMAND_TIMEOUT_RC
+    assert status.output == "started\n"
+
+    status = asyncio.run(shell_command.run_async(ctx))
+    assert status.rc == SHELL_COMMAND_TIMEOUT_RC
+    assert status.output == "started\n"
+
+
+def test_shell_command_async(scheduler_fixture, in_tmp_path):
+    async def run_all():
+        commands = [create_shell_command(f"sleep 0.5; echo {i}") for i in range(50)]
+        return await asyncio.gather(
+            *[
+                c.run_async(Action(f"test context {i}", inputs=set(), outputs=set()))
+                for i, c in enumerate(commands)
+            ]
+        )
+
+    t1 = time.perf_counter()
+    statuses = asyncio.run(run_all())
+    # All at the same time
+    assert time.perf_counter() - t1 < 5
+    assert [s.output for s in statuses] == [f"{i}\n" for i in range(50)]
+    assert all(s.rc == 0 for s in statuses)
+
+
+def test_shell_command_cancelled(scheduler_fixture, in_tmp_path):
+    ctx = Action("test context", inputs=set(), outputs=set())
+    marker = in_tmp_path / "marker"
+    shell_command = create_shell_command(f"sleep 1 && touch {marker}")
+
+    with AsyncEngine() as engine:
+        future = engine.submit(shell_command.run_async(ctx))
+        time.sleep(0.2)
+    assert future.cancelled()
+    # The shell and its children are killed
+    time.sleep(1.5)
+    assert not marker.exists()
+
+
+def test_shell_command_output_tail(scheduler_fixture, in_tmp_path):
+    ctx = Action("test/context", inputs=set(), outputs=set())
+    line_count = 100_000
+    shell_command = create_shell_command(
+        f"seq {line_count}; exit 3", output_tail_size=1000
+    )
+
+    for status in (shell_command(ctx), asyncio.run(shell_command.run_async(ctx))):
+        assert status.rc == 3
+        assert status.log_file is not None
+        # The full output is in the log file, and the status only has its last lines
+        log = Path(status.log_file).read_text()
+        assert log.splitlines() == [str(i) for i in range(1, line_count + 1)]
+        assert Path(status.log_file).parent.resolve() == JOB_LOG_DIR.resolve()
+        assert status.output is not None
+        note, *lines = status.output.splitlines()
+        assert note.startswith("[") and status.log_file in note
+        assert lines == log.splitlines()[-len(lines) :]
+        assert len(status.output) < 1100